@@ -222,10 +222,10 @@ class CVDWAgent:
         if self.llama_available and self.llama and len(leads) > 0:
             try:
                 print("[AGENT] Melhorando resposta com Llama...")
-                enhanced_response = self.llama.enhance_response(query, basic_response, leads)
+                # Resposta melhorada e insights de IA gerados em paralelo
+                enhanced_response, ai_insights = self.llama.enhance_with_insights(query, basic_response, leads, query_type)
                 
                 # Adiciona insights de IA se disponíveis
-                ai_insights = self.llama.generate_insights(leads, query_type)
                 if ai_insights:
                     enhanced_response += "\n\n💡 Insights de IA:\n"
                     for insight in ai_insights:
@@ -3,24 +3,56 @@ Complete Daily Cache CVDW - Coleta COMPLETA uma vez por dia
 Coleta TODOS os 70.871 leads com TODOS os 75 campos + campos adicionais
 Rotinas de limpeza automática às 00:00 e 23:00
 """
+import importlib.util
 import json
 import os
+import random
 import sqlite3
 import pandas as pd
 import threading
-import schedule
 import time
 import requests
-from typing import Dict, List, Any, Optional
-from datetime import datetime, date
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
+from .http_utils import AdaptiveThrottle, create_session, response_json, retry_after_seconds
+
+try:
+    from zoneinfo import ZoneInfo
+    CACHE_TIMEZONE = ZoneInfo('America/Sao_Paulo')
+except Exception:
+    # Sem zoneinfo/tzdata: usa o horário local do servidor
+    CACHE_TIMEZONE = None
 
 load_dotenv()
 
+
+def _cache_now() -> datetime:
+    """Horário atual no fuso de referência do cache (Brasília)"""
+    return datetime.now(CACHE_TIMEZONE)
+
 class CVDWCompleteDailyCache:
     """Cache diário com coleta COMPLETA da base CVDW"""
     
+    # SQL fixo das rotas quentes - reaproveitado pelo cache de statements do sqlite3
+    _SQL_INSERT_LEAD = (
+        'INSERT INTO daily_leads (date_cached, idlead, lead_data, additional_fields_count) '
+        'VALUES (?, ?, ?, ?)'
+    )
+    _SQL_INSERT_FIELD = (
+        'INSERT INTO daily_additional_fields '
+        '(date_cached, idlead, field_name, field_value, field_type, idcampo, reference_date) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)'
+    )
+    _SQL_SELECT_LEADS = 'SELECT lead_data FROM daily_leads WHERE date_cached = ? ORDER BY idlead'
+    _SQL_SELECT_LEADS_RANGE = _SQL_SELECT_LEADS + ' LIMIT ? OFFSET ?'
+    _SQL_COUNT_LEADS = 'SELECT COUNT(*) FROM daily_leads WHERE date_cached = ?'
+    _SQL_DELETE_LEADS = 'DELETE FROM daily_leads WHERE date_cached != ?'
+    _SQL_DELETE_FIELDS = 'DELETE FROM daily_additional_fields WHERE date_cached != ?'
+    _SQL_DELETE_LOGS = 'DELETE FROM daily_collection_log WHERE date != ?'
+    
     def __init__(self, cache_dir: str = "complete_daily_cache"):
         """Inicializa cache completo diário"""
         
@@ -43,12 +75,21 @@ class CVDWCompleteDailyCache:
             "Content-Type": "application/json"
         }
         
+        # Sessão HTTP reutilizada: uma conexão TLS keep-alive para todas as páginas
+        self.session = create_session(self.headers)
+        
+        # Rate limiting adaptativo (segundos entre requisições)
+        self._throttle = AdaptiveThrottle(base_interval=0.2, min_interval=0.1, max_interval=5.0)
+        
+        # Páginas baixadas simultaneamente na coleta completa
+        self.collection_workers = 4
+        
         # Base de dados SQLite otimizada
         self.db_file = self.cache_dir / "cvdw_complete_daily.db"
         self.metadata_file = self.cache_dir / "complete_metadata.json"
         
         # Data atual
-        self.today = date.today().isoformat()
+        self.today = _cache_now().date().isoformat()
         
         # Inicializa sistema
         self._init_database()
@@ -62,6 +103,12 @@ class CVDWCompleteDailyCache:
         """Inicializa base de dados SQLite otimizada"""
         
         with sqlite3.connect(self.db_file) as conn:
+            # Espaço liberado pelas limpezas é devolvido aos poucos (incremental_vacuum),
+            # sem VACUUM completo. Bases antigas são convertidas uma única vez.
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            
             # Tabela principal de leads
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS daily_leads (
@@ -114,6 +161,15 @@ class CVDWCompleteDailyCache:
             conn.execute('PRAGMA synchronous = NORMAL')
             conn.execute('PRAGMA cache_size = 10000')
     
+    def _connect(self) -> sqlite3.Connection:
+        """Abre conexão com cache de statements ampliado
+        
+        Uma conexão por operação: o cache é usado pela thread de rotinas
+        e pelas threads do Streamlit, e conexões sqlite3 não são compartilháveis.
+        """
+        
+        return sqlite3.connect(self.db_file, cached_statements=256)
+    
     def _load_metadata(self) -> Dict:
         """Carrega metadados"""
         
@@ -138,8 +194,14 @@ class CVDWCompleteDailyCache:
     def _save_metadata(self):
         """Salva metadados"""
         
+        content = json.dumps(self.metadata, indent=2, ensure_ascii=False)
+        
+        # Legível enquanto pequeno; compacto se crescer além de 1 KB
+        if len(content) > 1024:
+            content = json.dumps(self.metadata, separators=(',', ':'))
+        
         with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+            f.write(content)
     
     def has_complete_data_today(self) -> bool:
         """Verifica se já temos coleta completa para hoje"""
@@ -168,6 +230,9 @@ class CVDWCompleteDailyCache:
         if self.has_complete_data_today():
             return {"status": "already_collected", "message": "Dados já coletados hoje"}
         
+        # Data fixada no início: a rotina das 00:00 não divide a coleta em dois dias
+        date_cached = self.today
+        
         print(f"[COMPLETE_CACHE] INICIANDO COLETA COMPLETA - {datetime.now()}")
         start_time = datetime.now()
         
@@ -176,7 +241,7 @@ class CVDWCompleteDailyCache:
             conn.execute('''
                 INSERT OR REPLACE INTO daily_collection_log 
                 (date, collection_start, status) VALUES (?, ?, ?)
-            ''', (self.today, start_time.isoformat(), 'in_progress'))
+            ''', (date_cached, start_time.isoformat(), 'in_progress'))
         
         total_leads_collected = 0
         total_additional_fields = 0
@@ -186,17 +251,12 @@ class CVDWCompleteDailyCache:
             # Primeira requisição para descobrir total de páginas
             print("[COMPLETE_CACHE] Descobrindo total de dados disponíveis...")
             
-            response = requests.get(
-                f"{self.base_url}/leads",
-                headers=self.headers,
-                params={"registros_por_pagina": 500, "pagina": 1},
-                timeout=30
-            )
+            response = self._fetch_page(1)
             
             if response.status_code != 200:
                 raise Exception(f"API erro: {response.status_code} - {response.text}")
             
-            first_data = response.json()
+            first_data = response_json(response)
             total_records = first_data.get('total_de_registros', 0)
             total_pages = first_data.get('total_de_paginas', 0)
             
@@ -204,60 +264,55 @@ class CVDWCompleteDailyCache:
             
             # Processa primeira página
             if 'dados' in first_data:
-                self._store_page_data(first_data['dados'], self.today)
-                total_leads_collected += len(first_data['dados'])
-                total_additional_fields += self._count_additional_fields(first_data['dados'])
+                page_leads, page_additional = self._store_page_data(first_data['dados'], date_cached)
+                total_leads_collected += page_leads
+                total_additional_fields += page_additional
                 pages_processed = 1
                 
                 print(f"[COMPLETE_CACHE] Página 1/{total_pages} processada ({len(first_data['dados'])} leads)")
             
-            # Processa páginas restantes
-            for page in range(2, total_pages + 1):
-                try:
-                    # Rate limiting inteligente
-                    if page % 10 == 0:
-                        time.sleep(3)  # Pausa maior a cada 10 páginas
-                    else:
-                        time.sleep(1)  # Pausa padrão
-                    
-                    response = requests.get(
-                        f"{self.base_url}/leads",
-                        headers=self.headers,
-                        params={"registros_por_pagina": 500, "pagina": page},
-                        timeout=30
-                    )
+            # Processa páginas restantes: download em paralelo (lotes), gravação em ordem
+            batch_size = self.collection_workers * 2
+            finished = False
+            
+            with ThreadPoolExecutor(max_workers=self.collection_workers) as executor:
+                for batch_start in range(2, total_pages + 1, batch_size):
+                    batch_pages = list(range(batch_start, min(batch_start + batch_size, total_pages + 1)))
+                    futures = [executor.submit(self._download_page, page) for page in batch_pages]
                     
-                    if response.status_code == 200:
-                        page_data = response.json()
-                        
-                        if 'dados' in page_data and page_data['dados']:
-                            self._store_page_data(page_data['dados'], self.today)
-                            page_leads = len(page_data['dados'])
-                            page_additional = self._count_additional_fields(page_data['dados'])
-                            
-                            total_leads_collected += page_leads
-                            total_additional_fields += page_additional
-                            pages_processed = page
-                            
-                            if page % 25 == 0 or page == total_pages:  # Progress report
-                                elapsed = datetime.now() - start_time
-                                print(f"[COMPLETE_CACHE] Progresso: {page}/{total_pages} páginas | "
-                                      f"{total_leads_collected} leads | {elapsed}")
-                        else:
-                            print(f"[COMPLETE_CACHE] Página {page} vazia, finalizando...")
-                            break
+                    for page, future in zip(batch_pages, futures):
+                        try:
+                            status_code, page_data = future.result()
                             
-                    elif response.status_code == 429:  # Rate limit
-                        print(f"[COMPLETE_CACHE] Rate limit na página {page}, aguardando...")
-                        time.sleep(10)
-                        continue
-                    else:
-                        print(f"[COMPLETE_CACHE] Erro na página {page}: {response.status_code}")
-                        continue
-                        
-                except Exception as e:
-                    print(f"[COMPLETE_CACHE] Erro na página {page}: {str(e)}")
-                    continue
+                            if status_code == 200:
+                                if 'dados' in page_data and page_data['dados']:
+                                    page_leads, page_additional = self._store_page_data(page_data['dados'], date_cached)
+                                    
+                                    total_leads_collected += page_leads
+                                    total_additional_fields += page_additional
+                                    pages_processed = page
+                                    
+                                    if page % 25 == 0 or page == total_pages:  # Progress report
+                                        elapsed = datetime.now() - start_time
+                                        print(f"[COMPLETE_CACHE] Progresso: {page}/{total_pages} páginas | "
+                                              f"{total_leads_collected} leads | {elapsed}")
+                                else:
+                                    print(f"[COMPLETE_CACHE] Página {page} vazia, finalizando...")
+                                    finished = True
+                                    break
+                                    
+                            else:
+                                print(f"[COMPLETE_CACHE] Erro na página {page}: {status_code}")
+                                continue
+                                
+                        except Exception as e:
+                            print(f"[COMPLETE_CACHE] Erro na página {page}: {str(e)}")
+                            continue
+                    
+                    if finished:
+                        for future in futures:
+                            future.cancel()
+                        break
             
             # Finaliza coleta
             end_time = datetime.now()
@@ -279,7 +334,7 @@ class CVDWCompleteDailyCache:
                     end_time.isoformat(),
                     pages_processed,
                     'completed',
-                    self.today
+                    date_cached
                 ))
             
             # Atualiza metadados
@@ -291,13 +346,16 @@ class CVDWCompleteDailyCache:
             })
             self._save_metadata()
             
+            # Snapshot colunar para leituras rápidas do DataFrame
+            self._write_snapshot()
+            
             result = {
                 "status": "success",
                 "total_leads_collected": total_leads_collected,
                 "total_additional_fields": total_additional_fields,
                 "pages_processed": pages_processed,
                 "duration_minutes": round(duration.total_seconds() / 60, 2),
-                "collection_date": self.today
+                "collection_date": date_cached
             }
             
             print(f"[COMPLETE_CACHE] COLETA CONCLUÍDA!")
@@ -318,7 +376,7 @@ class CVDWCompleteDailyCache:
                         total_leads_collected = ?,
                         pages_processed = ?
                     WHERE date = ?
-                ''', ('error', str(e), total_leads_collected, pages_processed, self.today))
+                ''', ('error', str(e), total_leads_collected, pages_processed, date_cached))
             
             print(f"[COMPLETE_CACHE] ERRO na coleta: {str(e)}")
             return {
@@ -328,41 +386,86 @@ class CVDWCompleteDailyCache:
                 "pages_processed": pages_processed
             }
     
-    def _store_page_data(self, leads: List[Dict], date_cached: str):
-        """Armazena dados de uma página na base"""
+    def _download_page(self, page: int) -> Tuple[int, Optional[Dict]]:
+        """Busca e decodifica uma página (executado nas threads da coleta)"""
         
-        with sqlite3.connect(self.db_file) as conn:
-            for lead in leads:
-                # Dados principais do lead
-                lead_json = json.dumps(lead, ensure_ascii=False, default=str)
-                additional_count = len(lead.get('campos_adicionais', []))
-                
-                conn.execute('''
-                    INSERT INTO daily_leads 
-                    (date_cached, idlead, lead_data, additional_fields_count)
-                    VALUES (?, ?, ?, ?)
-                ''', (date_cached, lead.get('idlead'), lead_json, additional_count))
-                
-                # Campos adicionais (normalized)
-                for campo in lead.get('campos_adicionais', []):
-                    conn.execute('''
-                        INSERT INTO daily_additional_fields
-                        (date_cached, idlead, field_name, field_value, field_type, idcampo, reference_date)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        date_cached,
-                        lead.get('idlead'),
-                        campo.get('nome'),
-                        campo.get('valor'),
-                        campo.get('tipo'),
-                        campo.get('idcampo'),
-                        campo.get('referencia_data')
-                    ))
+        response = self._fetch_page(page)
+        if response.status_code != 200:
+            return response.status_code, None
+        
+        return 200, response_json(response)
     
-    def _count_additional_fields(self, leads: List[Dict]) -> int:
-        """Conta campos adicionais em uma lista de leads"""
+    def _fetch_page(self, page: int, max_retries: int = 5) -> requests.Response:
+        """Busca uma página respeitando o intervalo adaptativo
         
-        return sum(len(lead.get('campos_adicionais', [])) for lead in leads)
+        Respostas 200 reduzem o intervalo; 429 aumenta o intervalo, aguarda o
+        Retry-After do servidor (ou backoff com jitter, se ausente) e tenta a
+        MESMA página novamente.
+        """
+        
+        backoff = 1.0
+        for attempt in range(max_retries + 1):
+            # Próximo horário livre; threads concorrentes respeitam o mesmo ritmo
+            self._throttle.wait()
+            
+            response = self.session.get(
+                f"{self.base_url}/leads",
+                params={"registros_por_pagina": 500, "pagina": page},
+                timeout=30
+            )
+            
+            if response.status_code == 200:
+                self._throttle.on_success()
+                return response
+            
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            
+            self._throttle.on_rate_limited()
+            retry_after = retry_after_seconds(response)
+            if retry_after is None:
+                # Backoff exponencial descorrelacionado: evita retries sincronizados
+                backoff = min(30.0, random.uniform(1.0, backoff * 3))
+                retry_after = backoff
+            retry_after = round(retry_after, 1)
+            
+            print(f"[COMPLETE_CACHE] Rate limit na página {page}, aguardando {retry_after}s...")
+            time.sleep(retry_after)
+        
+        return response
+    
+    def _store_page_data(self, leads: List[Dict], date_cached: str) -> Tuple[int, int]:
+        """Armazena dados de uma página na base
+        
+        Retorna (leads armazenados, campos adicionais armazenados)
+        """
+        
+        lead_rows = []
+        field_rows = []
+        
+        for lead in leads:
+            # Dados principais do lead
+            lead_json = json.dumps(lead, ensure_ascii=False, default=str)
+            campos = lead.get('campos_adicionais', [])
+            lead_rows.append((date_cached, lead.get('idlead'), lead_json, len(campos)))
+            
+            # Campos adicionais (normalized)
+            for campo in campos:
+                field_rows.append((
+                    date_cached,
+                    lead.get('idlead'),
+                    campo.get('nome'),
+                    campo.get('valor'),
+                    campo.get('tipo'),
+                    campo.get('idcampo'),
+                    campo.get('referencia_data')
+                ))
+        
+        with self._connect() as conn:
+            conn.executemany(self._SQL_INSERT_LEAD, lead_rows)
+            conn.executemany(self._SQL_INSERT_FIELD, field_rows)
+        
+        return len(lead_rows), len(field_rows)
     
     def get_complete_leads(self) -> Optional[List[Dict]]:
         """Retorna todos os leads do cache diário"""
@@ -371,17 +474,7 @@ class CVDWCompleteDailyCache:
             return None
         
         try:
-            leads = []
-            
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.execute(
-                    'SELECT lead_data FROM daily_leads WHERE date_cached = ? ORDER BY idlead',
-                    (self.today,)
-                )
-                
-                for (lead_json,) in cursor:
-                    lead = json.loads(lead_json)
-                    leads.append(lead)
+            leads = list(self._iter_cached_leads())
             
             print(f"[COMPLETE_CACHE] Retornados {len(leads)} leads do cache completo")
             return leads
@@ -390,15 +483,112 @@ class CVDWCompleteDailyCache:
             print(f"[COMPLETE_CACHE] Erro ao recuperar leads: {str(e)}")
             return None
     
-    def get_leads_dataframe(self) -> Optional[pd.DataFrame]:
-        """Retorna DataFrame completo otimizado para análise"""
+    def get_complete_leads_range(self, start: int, stop: int) -> Optional[List[Dict]]:
+        """Retorna apenas os leads [start:stop] do cache, sem decodificar o restante"""
+        
+        if not self.has_complete_data_today():
+            return None
+        
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    self._SQL_SELECT_LEADS_RANGE,
+                    (self.today, max(0, stop - start), start)
+                )
+                return [json.loads(lead_json) for (lead_json,) in cursor]
+                
+        except Exception as e:
+            print(f"[COMPLETE_CACHE] Erro ao recuperar faixa de leads: {str(e)}")
+            return None
+    
+    def count_complete_leads(self) -> int:
+        """Quantidade de leads no cache de hoje"""
+        
+        with self._connect() as conn:
+            return conn.execute(self._SQL_COUNT_LEADS, (self.today,)).fetchone()[0]
+    
+    def iter_complete_leads(self) -> Iterator[Dict]:
+        """Itera os leads do cache diário um a um, sem materializar a lista"""
+        
+        if not self.has_complete_data_today():
+            return iter(())
+        
+        return self._iter_cached_leads()
+    
+    def _iter_cached_leads(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Lê os leads de hoje do SQLite em lotes, decodificando sob demanda"""
+        
+        conn = self._connect()
+        try:
+            cursor = conn.execute(self._SQL_SELECT_LEADS, (self.today,))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                
+                for (lead_json,) in rows:
+                    yield json.loads(lead_json)
+        finally:
+            conn.close()
+    
+    def _snapshot_path(self) -> Path:
+        """Caminho do snapshot Feather (Arrow IPC) do dia"""
+        
+        return self.cache_dir / f"{self.today}.feather"
+    
+    def _write_snapshot(self):
+        """Grava snapshot Feather do dia (uma vez por coleta)"""
+        
+        # Sem pyarrow o to_feather falharia; evita montar o DataFrame à toa
+        if importlib.util.find_spec("pyarrow") is None:
+            print("[COMPLETE_CACHE] pyarrow não instalado - snapshot Feather ignorado")
+            return
+        
+        df = self._build_leads_dataframe()
+        if df is None:
+            return
+        
+        try:
+            df.to_feather(self._snapshot_path(), compression='zstd')
+            print(f"[COMPLETE_CACHE] Snapshot Feather gravado: {self._snapshot_path().name}")
+        except Exception as e:
+            print(f"[COMPLETE_CACHE] Aviso - snapshot Feather não gravado: {str(e)}")
+    
+    def get_leads_dataframe(self, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Retorna DataFrame completo otimizado para análise
+        
+        Com columns, lê do snapshot colunar apenas as colunas pedidas que existirem.
+        """
+        
+        snapshot = self._snapshot_path()
+        if snapshot.exists():
+            try:
+                if columns is None:
+                    return pd.read_feather(snapshot)
+                
+                import pyarrow.ipc  # já exigido por read_feather
+                available = set(pyarrow.ipc.open_file(str(snapshot)).schema.names)
+                return pd.read_feather(snapshot, columns=[col for col in columns if col in available])
+            except Exception as e:
+                print(f"[COMPLETE_CACHE] Erro ao ler snapshot Feather: {str(e)} - reconstruindo")
+        
+        df = self._build_leads_dataframe()
+        if df is not None and columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        
+        return df
+    
+    def _build_leads_dataframe(self) -> Optional[pd.DataFrame]:
+        """Reconstrói DataFrame a partir do SQLite (JSON por lead)"""
         
-        leads = self.get_complete_leads()
-        if not leads:
+        if not self.has_complete_data_today():
             return None
         
         try:
-            df = pd.DataFrame(leads)
+            df = pd.DataFrame.from_records(self._iter_cached_leads())
+            if df.empty:
+                return None
             
             # Otimizações para análise
             date_columns = [
@@ -474,24 +664,38 @@ class CVDWCompleteDailyCache:
     def _setup_scheduled_tasks(self):
         """Configura rotinas automáticas"""
         
-        schedule.every().day.at("00:00").do(self._midnight_cleanup)
-        schedule.every().day.at("23:00").do(self._evening_cleanup)
-        
-        scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        scheduler_thread.start()
+        self._arm_daily_task("00:00", self._midnight_cleanup)
+        self._arm_daily_task("23:00", self._evening_cleanup)
         
         print("[COMPLETE_CACHE] Rotinas automáticas: 00:00 (reset) e 23:00 (limpeza)")
     
-    def _run_scheduler(self):
-        """Executa scheduler em background"""
+    @staticmethod
+    def _seconds_until(at_time: str) -> float:
+        """Segundos até a próxima ocorrência do horário HH:MM"""
+        
+        now = _cache_now()
+        hour, minute = (int(part) for part in at_time.split(':'))
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        
+        if target <= now:
+            target += timedelta(days=1)
+        
+        return (target - now).total_seconds()
+    
+    def _arm_daily_task(self, at_time: str, task):
+        """Agenda a tarefa para o próximo HH:MM; ela se reagenda após rodar"""
         
-        while True:
+        def run():
             try:
-                schedule.run_pending()
-                time.sleep(60)
+                task()
             except Exception as e:
-                print(f"[COMPLETE_CACHE] Erro no scheduler: {str(e)}")
-                time.sleep(300)
+                print(f"[COMPLETE_CACHE] Erro na rotina das {at_time}: {str(e)}")
+            finally:
+                self._arm_daily_task(at_time, task)
+        
+        timer = threading.Timer(self._seconds_until(at_time), run)
+        timer.daemon = True
+        timer.start()
     
     def _midnight_cleanup(self):
         """Rotina 00:00 - Novo dia, reset completo"""
@@ -499,7 +703,7 @@ class CVDWCompleteDailyCache:
         print("[COMPLETE_CACHE] === ROTINA 00:00 - NOVO DIA ===")
         
         # Atualiza data
-        self.today = date.today().isoformat()
+        self.today = _cache_now().date().isoformat()
         
         # Limpa dados antigos
         self.cleanup_old_data()
@@ -521,30 +725,36 @@ class CVDWCompleteDailyCache:
         
         print("[COMPLETE_CACHE] === ROTINA 23:00 - LIMPEZA PREVENTIVA ===")
         
-        # Remove apenas dados muito antigos (mantém hoje)
-        with sqlite3.connect(self.db_file) as conn:
-            conn.execute('DELETE FROM daily_leads WHERE date_cached < ?', (self.today,))
-            conn.execute('DELETE FROM daily_additional_fields WHERE date_cached < ?', (self.today,))
-            conn.execute('DELETE FROM daily_collection_log WHERE date < ?', (self.today,))
-            conn.execute('VACUUM')
+        # Remove dados de outros dias (mantém hoje)
+        self.cleanup_old_data()
     
     def cleanup_old_data(self) -> Dict[str, int]:
         """Limpeza completa de dados antigos"""
         
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                # Remove dados antigos
-                cursor = conn.execute('DELETE FROM daily_leads WHERE date_cached != ?', (self.today,))
-                leads_removed = cursor.rowcount
-                
-                cursor = conn.execute('DELETE FROM daily_additional_fields WHERE date_cached != ?', (self.today,))
-                fields_removed = cursor.rowcount
-                
-                cursor = conn.execute('DELETE FROM daily_collection_log WHERE date != ?', (self.today,))
-                logs_removed = cursor.rowcount
+            conn = self._connect()
+            try:
+                # Remove dados antigos - uma única transação para as três tabelas
+                with conn:
+                    cursor = conn.execute(self._SQL_DELETE_LEADS, (self.today,))
+                    leads_removed = cursor.rowcount
+                    
+                    cursor = conn.execute(self._SQL_DELETE_FIELDS, (self.today,))
+                    fields_removed = cursor.rowcount
+                    
+                    cursor = conn.execute(self._SQL_DELETE_LOGS, (self.today,))
+                    logs_removed = cursor.rowcount
                 
-                # Compacta base
-                conn.execute('VACUUM')
+                # Devolve páginas livres sem reescrever a base inteira
+                conn.execute('PRAGMA incremental_vacuum')
+            finally:
+                conn.close()
+            
+            # Remove snapshots de outros dias (inclui .parquet de versões anteriores)
+            for pattern in ('*.feather', '*.parquet'):
+                for snapshot in self.cache_dir.glob(pattern):
+                    if snapshot != self._snapshot_path():
+                        snapshot.unlink()
             
             print(f"[COMPLETE_CACHE] Limpeza: {leads_removed} leads, {fields_removed} campos adicionais removidos")
             
@@ -558,6 +768,33 @@ class CVDWCompleteDailyCache:
             print(f"[COMPLETE_CACHE] Erro na limpeza: {str(e)}")
             return {"error": str(e)}
     
+    def force_refresh(self) -> bool:
+        """Descarta a coleta de hoje - a próxima consulta coleta tudo novamente"""
+        
+        try:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM daily_leads WHERE date_cached = ?', (self.today,))
+                conn.execute('DELETE FROM daily_additional_fields WHERE date_cached = ?', (self.today,))
+                conn.execute('DELETE FROM daily_collection_log WHERE date = ?', (self.today,))
+            
+            if self._snapshot_path().exists():
+                self._snapshot_path().unlink()
+            
+            self.metadata.update({
+                "last_complete_collection": None,
+                "total_leads_cached": 0,
+                "total_additional_fields": 0,
+                "collection_status": "pending"
+            })
+            self._save_metadata()
+            
+            print(f"[COMPLETE_CACHE] Coleta de {self.today} descartada - será refeita na próxima consulta")
+            return True
+            
+        except Exception as e:
+            print(f"[COMPLETE_CACHE] Erro ao forçar refresh: {str(e)}")
+            return False
+    
     def get_cache_status(self) -> Dict[str, Any]:
         """Status completo do cache"""
         
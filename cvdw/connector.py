@@ -2,21 +2,77 @@
 Conector CVDW - Conexão otimizada com cache diário completo
 Coleta TODOS os dados uma vez por dia, consultas instantâneas depois
 """
-import requests
-import json
-import time
+import functools
+import heapq
+import logging
+import math
+import operator
 import os
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import date, datetime
 from dotenv import load_dotenv
 from .complete_daily_cache import create_complete_daily_cache
+from .http_utils import create_session, response_json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_daily_cache():
+    """Cache diário único por processo, compartilhado entre conectores"""
+    return create_complete_daily_cache()
+
+# Campos que podem identificar o responsável pelo lead, em ordem de prioridade
+_RESPONSAVEL_KEYS = ('corretor', 'responsavel', 'gestor', 'vendedor')
+
+# Palavras do tipo de consulta que ativam cada análise (inclui categorias ORIGENS/RESPONSAVEIS)
+_ORIGEM_TOKENS = frozenset(('origem', 'origens'))
+_RESP_TOKENS = frozenset(('sdr', 'responsavel', 'responsaveis', 'corretor'))
+
+
+def _responsavel(lead: Dict, _keys: tuple = _RESPONSAVEL_KEYS) -> str:
+    """Primeiro campo de responsável preenchido no lead"""
+    for key in _keys:
+        value = lead.get(key)
+        if value:
+            return value
+    return 'Não informado'
+
+
+def _parse_data_cad(data_cad: str) -> date:
+    """Data de cadastro do lead (ignora a hora)
+
+    Caminho rápido com date.fromisoformat (formato da API, 'AAAA-MM-DD HH:MM:SS');
+    strptime só para o que não estiver no formato ISO estrito (ex.: mês sem zero).
+    Levanta ValueError se a data for inválida.
+    """
+    try:
+        return date.fromisoformat(data_cad[:10])
+    except ValueError:
+        return datetime.strptime(data_cad.split(' ')[0], '%Y-%m-%d').date()
+
 class CVDWConnector:
     """Conector otimizado para API CVDW da BP Incorporadora"""
     
+    __slots__ = (
+        "email", "token", "base_url", "headers", "max_workers", "session",
+        "daily_cache", "cache_enabled", "simple_cache", "simple_cache_max", "_simple_cache_lock",
+        "cache_timeout", "stale_if_error_timeout", "last_test_result", "total_leads_available"
+    )
+    
     def __init__(self, email: str = None, token: str = None):
         """Inicializa conector com cache diário completo"""
         
@@ -36,227 +92,264 @@ class CVDWConnector:
             "Content-Type": "application/json"
         }
         
+        # Requisições simultâneas na coleta tradicional
+        self.max_workers = 8
+        
+        # Sessão HTTP reutilizada (keep-alive); 429 e 5xx com retry/backoff do urllib3.
+        # Um único host: um pool com uma conexão persistente por worker, sem abrir extras.
+        self.session = create_session(
+            self.headers,
+            pool_connections=1,
+            pool_maxsize=self.max_workers,
+            pool_block=True,
+            backoff_factor=1.0,
+            status_forcelist=(429, 500, 502, 503, 504)
+        )
+        
         # Sistema de cache diário completo
         try:
-            self.daily_cache = create_complete_daily_cache()
+            self.daily_cache = _shared_daily_cache()
             self.cache_enabled = True
-            print("[CONNECTOR] Cache diário completo inicializado")
+            logger.info("[CONNECTOR] Cache diário completo inicializado")
         except Exception as e:
-            print(f"[CONNECTOR] Aviso - Cache diário não disponível: {str(e)}")
+            logger.warning("[CONNECTOR] Aviso - Cache diário não disponível: %s", e)
             self.daily_cache = None
             self.cache_enabled = False
         
         # Cache simples fallback
-        self.simple_cache = {}
+        self.simple_cache = OrderedDict()  # LRU limitado a simple_cache_max entradas
+        self.simple_cache_max = 32
+        # O conector é compartilhado entre sessões do Streamlit (st.cache_resource) e
+        # chamado de várias threads: todo acesso ao OrderedDict passa por este lock
+        self._simple_cache_lock = threading.Lock()
         self.cache_timeout = 300  # 5 minutos
+        self.stale_if_error_timeout = 3600  # expirado ainda serve se a API falhar (429/5xx)
         
         # Status
         self.last_test_result = None
         self.total_leads_available = 0
     
     def test_connection(self) -> Dict[str, Any]:
-        """Testa conexão com API CVDW com retry inteligente"""
-        
-        max_retries = 3
-        base_delay = 5  # segundos
+        """Testa conexão com API CVDW (retry de 429/5xx feito pela sessão)"""
         
-        for attempt in range(max_retries):
-            try:
-                if attempt > 0:
-                    delay = base_delay * (attempt + 1)  # 5, 10, 15 segundos
-                    print(f"[RETRY {attempt+1}] Aguardando {delay}s para evitar rate limit...")
-                    time.sleep(delay)
-                
-                # Chamada de teste com poucos registros
-                response = requests.get(
-                    f"{self.base_url}/leads",
-                    headers=self.headers,
-                    params={"registros_por_pagina": 10},
-                    timeout=20
-                )
+        try:
+            # Chamada de teste com um único registro: só interessam status e totais
+            response = self.session.get(
+                f"{self.base_url}/leads",
+                params={"registros_por_pagina": 1},
+                timeout=20
+            )
+            
+            if response.status_code == 200:
+                data = response_json(response)
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if isinstance(data, dict) and 'total_de_registros' in data:
+                    self.total_leads_available = data.get('total_de_registros', 0)
                     
-                    if isinstance(data, dict) and 'total_de_registros' in data:
-                        self.total_leads_available = data.get('total_de_registros', 0)
-                        
-                        result = {
-                            "status": "success",
-                            "message": f"API CVDW online - {self.total_leads_available} leads disponíveis",
-                            "total_leads": self.total_leads_available,
-                            "total_paginas": data.get('total_de_paginas', 0),
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        self.last_test_result = result
-                        return result
-                    else:
-                        return {
-                            "status": "error",
-                            "message": "Formato de resposta inesperado da API"
-                        }
-                        
-                elif response.status_code == 429:  # Rate limiting
-                    if attempt < max_retries - 1:
-                        print(f"[RATE LIMIT] Tentativa {attempt+1} - aguardando mais...")
-                        continue
-                    else:
-                        return {
-                            "status": "warning",
-                            "message": "API temporariamente indisponível (rate limit) - tente novamente em alguns minutos",
-                            "retry_suggested": True
-                        }
+                    result = {
+                        "status": "success",
+                        "message": f"API CVDW online - {self.total_leads_available} leads disponíveis",
+                        "total_leads": self.total_leads_available,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                    
+                    self.last_test_result = result
+                    return result
                 else:
                     return {
-                        "status": "error", 
-                        "message": f"API retornou status {response.status_code}"
+                        "status": "error",
+                        "message": "Formato de resposta inesperado da API"
                     }
                     
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    continue
+            elif response.status_code == 429:  # Rate limiting persistente após retries
                 return {
-                    "status": "error",
-                    "message": f"Erro ao conectar: {str(e)}"
+                    "status": "warning",
+                    "message": "API temporariamente indisponível (rate limit) - tente novamente em alguns minutos",
+                    "retry_suggested": True
                 }
-        
-        return {
-            "status": "error",
-            "message": "Não foi possível conectar após múltiplas tentativas"
-        }
+            else:
+                return {
+                    "status": "error", 
+                    "message": f"API retornou status {response.status_code}"
+                }
+                
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Erro ao conectar: {str(e)}"
+            }
     
     def get_leads(self, limit: int = 100, start_page: int = 1) -> Dict[str, Any]:
         """Busca leads com cache diário inteligente"""
         
-        print(f"[CONNECTOR] Solicitação: {limit} leads (página {start_page})")
+        logger.info("[CONNECTOR] Solicitação: %d leads (página %d)", limit, start_page)
+        
+        # Paginação calculada uma vez para cache e fallback
+        per_page = min(500, limit)
+        start_index = (start_page - 1) * per_page
+        end_index = start_index + limit
         
         # Estratégia 1: Cache diário completo (preferido)
         if self.cache_enabled and self.daily_cache:
             try:
                 # Verifica se tem dados completos hoje
                 if self.daily_cache.has_complete_data_today():
-                    print("[CONNECTOR] Usando dados do cache diário (instantâneo)")
+                    logger.info("[CONNECTOR] Usando dados do cache diário (instantâneo)")
                     
-                    cached_leads = self.daily_cache.get_complete_leads()
-                    if cached_leads:
-                        # Aplica paginação nos dados em cache
-                        start_index = (start_page - 1) * min(500, limit)
-                        end_index = start_index + limit
-                        selected_leads = cached_leads[start_index:end_index]
-                        
+                    selected_leads, total_cached = self._read_daily_cache_page(start_index, end_index)
+                    if total_cached:
                         return {
                             "status": "success",
                             "leads": selected_leads,
                             "total_coletados": len(selected_leads),
                             "metadata": {
                                 "source": "daily_cache",
-                                "total_disponivel": len(cached_leads),
+                                "total_disponivel": total_cached,
                                 "cache_date": self.daily_cache.today,
                                 "instant_response": True
                             },
                             "timestamp": datetime.now().isoformat()
                         }
                 else:
-                    print("[CONNECTOR] Dados não coletados hoje - iniciando coleta completa...")
-                    print("[CONNECTOR] AVISO: Esta primeira consulta será demorada (~15-20 min)")
+                    logger.info("[CONNECTOR] Dados não coletados hoje - iniciando coleta completa...")
+                    logger.warning("[CONNECTOR] AVISO: Esta primeira consulta será demorada (~15-20 min)")
                     
                     # Coleta TODOS os dados (primeira vez do dia)
                     collection_result = self.daily_cache.collect_all_leads()
                     
                     if collection_result["status"] == "success":
-                        print(f"[CONNECTOR] Coleta completa finalizada: {collection_result['total_leads_collected']} leads")
+                        logger.info("[CONNECTOR] Coleta completa finalizada: %d leads", collection_result['total_leads_collected'])
                         
                         # Agora retorna os dados solicitados
-                        cached_leads = self.daily_cache.get_complete_leads()
-                        if cached_leads:
-                            start_index = (start_page - 1) * min(500, limit)
-                            end_index = start_index + limit
-                            selected_leads = cached_leads[start_index:end_index]
-                            
+                        selected_leads, total_cached = self._read_daily_cache_page(start_index, end_index)
+                        if total_cached:
                             return {
                                 "status": "success",
                                 "leads": selected_leads,
                                 "total_coletados": len(selected_leads),
                                 "metadata": {
                                     "source": "fresh_daily_collection",
-                                    "total_disponivel": len(cached_leads),
+                                    "total_disponivel": total_cached,
                                     "collection_duration": collection_result.get("duration_minutes"),
                                     "first_collection_today": True
                                 },
                                 "timestamp": datetime.now().isoformat()
                             }
                     else:
-                        print(f"[CONNECTOR] Falha na coleta completa: {collection_result.get('message', 'Erro desconhecido')}")
+                        logger.warning("[CONNECTOR] Falha na coleta completa: %s", collection_result.get('message', 'Erro desconhecido'))
                         # Fallback para método tradicional
                         
             except Exception as e:
-                print(f"[CONNECTOR] Erro no cache diário: {str(e)} - usando fallback")
+                logger.warning("[CONNECTOR] Erro no cache diário: %s - usando fallback", e)
         
         # Estratégia 2: Método tradicional (fallback)
-        print("[CONNECTOR] Usando método tradicional de coleta")
-        return self._get_leads_traditional(limit, start_page)
+        logger.info("[CONNECTOR] Usando método tradicional de coleta")
+        return self._get_leads_traditional(limit, start_page, per_page)
     
-    def _get_leads_traditional(self, limit: int, start_page: int) -> Dict[str, Any]:
+    def _read_daily_cache_page(self, start_index: int, end_index: int) -> Tuple[List[Dict], int]:
+        """Lê do cache diário só a faixa pedida, retornando (leads, total em cache)"""
+        
+        selected_leads = self.daily_cache.get_complete_leads_range(start_index, end_index) or []
+        
+        return selected_leads, self.daily_cache.count_complete_leads()
+    
+    def _get_leads_traditional(self, limit: int, start_page: int, records_per_page: int) -> Dict[str, Any]:
         """Método tradicional de coleta (fallback) com ordenação por data"""
 
         # Verifica cache simples
         cache_key = f"leads_{limit}_{start_page}"
-        if cache_key in self.simple_cache:
-            cached_data = self.simple_cache[cache_key]
+        with self._simple_cache_lock:
+            cached_data = self.simple_cache.get(cache_key)
+            if cached_data:
+                self.simple_cache.move_to_end(cache_key)
+        if cached_data:
             if time.time() - cached_data['timestamp'] < self.cache_timeout:
                 return cached_data['data']
+        
+        # Entrada expirada com validadores: revalida com GET condicional
+        conditional_headers = {}
+        if cached_data:
+            if cached_data.get('etag'):
+                conditional_headers['If-None-Match'] = cached_data['etag']
+            if cached_data.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = cached_data['last_modified']
 
         # ESTRATÉGIA: Buscar mais páginas para garantir dados recentes, depois ordenar
-        leads_collected = []
         page = start_page
-        records_per_page = min(500, limit)
         max_pages_to_fetch = min(10, (limit // 100) + 3)  # Busca mais páginas para filtrar depois
         
+        pages_needed = min(max_pages_to_fetch, math.ceil(limit * 2 / records_per_page))
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        
         try:
-            pages_fetched = 0
-            while len(leads_collected) < (limit * 2) and pages_fetched < max_pages_to_fetch:  # Busca o dobro para depois filtrar
-                if page > start_page:
-                    time.sleep(2)
-
-                pages_fetched += 1
-                
-                response = requests.get(
-                    f"{self.base_url}/leads",
-                    headers=self.headers,
-                    params={
-                        "registros_por_pagina": records_per_page,
-                        "pagina": page
-                    },
-                    timeout=30
+            # Total já conhecido (test_connection ou coleta anterior): dispara as demais
+            # páginas junto com a primeira. Em revalidação (GET condicional) espera o 304.
+            pages_results = None
+            if self.total_leads_available and not conditional_headers:
+                known_pages = math.ceil(self.total_leads_available / records_per_page)
+                last_page = min(known_pages, start_page + pages_needed - 1)
+                remaining_pages = list(range(start_page + 1, last_page + 1))
+                pages_results = executor.map(
+                    lambda p: self._fetch_leads_page(p, records_per_page),
+                    remaining_pages
                 )
-                
-                if response.status_code == 200:
-                    data = response.json()
+            
+            # Primeira página informa o total de páginas disponíveis
+            response = self._request_leads_page(start_page, records_per_page, conditional_headers)
+            
+            if response.status_code == 304 and cached_data:
+                logger.info("[CONNECTOR] Dados inalterados no servidor (304) - usando cache simples")
+                cached_data['timestamp'] = time.time()
+                return cached_data['data']
+            
+            if response.status_code != 200:
+                if cached_data:
+                    return self._stale_result(cached_data, f"HTTP {response.status_code}")
+                return {
+                    "status": "error",
+                    "message": f"Erro HTTP {response.status_code}"
+                }
+            
+            data = response_json(response)
+            first_page_validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            self.total_leads_available = data.get('total_de_registros', self.total_leads_available)
+            first_page_leads = data.get('dados') or []
+            logger.debug("[CONNECTOR] Página %d: %d leads (Total: %d)", page, len(first_page_leads), len(first_page_leads))
+            
+            # Demais páginas em paralelo - busca o dobro do limite para depois filtrar
+            if pages_results is None:
+                last_page = min(data.get('total_de_paginas', 1), start_page + pages_needed - 1)
+                remaining_pages = list(range(start_page + 1, last_page + 1)) if first_page_leads else []
+                pages_results = executor.map(
+                    lambda p: self._fetch_leads_page(p, records_per_page),
+                    remaining_pages
+                )
+            
+            # Lista pré-alocada para todas as páginas previstas, preenchida por fatia
+            offset = len(first_page_leads)
+            leads_collected = [None] * (offset + len(remaining_pages) * records_per_page)
+            leads_collected[:offset] = first_page_leads
+            
+            if first_page_leads:
+                for next_page, (status_code, page_leads) in zip(remaining_pages, pages_results):
+                    if status_code != 200:
+                        if cached_data:
+                            return self._stale_result(cached_data, f"HTTP {status_code}")
+                        return {
+                            "status": "error",
+                            "message": f"Erro HTTP {status_code}"
+                        }
                     
-                    if 'dados' in data and data['dados']:
-                        page_leads = data['dados']
-                        leads_collected.extend(page_leads)
-                        
-                        print(f"[CONNECTOR] Página {page}: {len(page_leads)} leads (Total: {len(leads_collected)})")
-                        
-                        if len(leads_collected) >= (limit * 2) or page >= data.get('total_de_paginas', 1) or pages_fetched >= max_pages_to_fetch:
-                            break
-                            
-                        page += 1
-                    else:
+                    if not page_leads:
                         break
-                        
-                elif response.status_code == 429:
-                    print("[CONNECTOR] Rate limit - aguardando...")
-                    time.sleep(10)
-                    continue
                     
-                else:
-                    return {
-                        "status": "error",
-                        "message": f"Erro HTTP {response.status_code}"
-                    }
+                    leads_collected[offset:offset + len(page_leads)] = page_leads
+                    offset += len(page_leads)
+                    page = next_page
+                    logger.debug("[CONNECTOR] Página %d: %d leads (Total: %d)", page, len(page_leads), offset)
+            
+            # Descarta posições não preenchidas (páginas menores ou ausentes)
+            del leads_collected[offset:]
             
             # ORDENAÇÃO POR DATA (MAIS RECENTES PRIMEIRO)
             leads_with_dates = []
@@ -266,34 +359,24 @@ class CVDWConnector:
                 data_cad = lead.get('data_cad', '')
                 if data_cad:
                     try:
-                        # Converte data para timestamp para ordenação
-                        if ' ' in data_cad:
-                            date_part = data_cad.split(' ')[0]  # Remove hora se houver
-                        else:
-                            date_part = data_cad
-
-                        from datetime import datetime
-                        date_obj = datetime.strptime(date_part, '%Y-%m-%d')
-                        lead['_date_obj'] = date_obj
-                        leads_with_dates.append(lead)
-                    except:
+                        leads_with_dates.append((_parse_data_cad(data_cad), lead))
+                    except (TypeError, AttributeError, ValueError):
                         leads_without_dates.append(lead)
                 else:
                     leads_without_dates.append(lead)
 
-            # Ordena por data (mais recente primeiro)
-            leads_with_dates.sort(key=lambda x: x['_date_obj'], reverse=True)
+            # Só os `limit` mais recentes são devolvidos. Se as páginas já vieram da mais
+            # recente para a mais antiga, basta cortar; senão seleção parcial com heap em
+            # vez de ordenar tudo o que foi coletado (mesma ordem de sorted estável)
+            dates = list(map(operator.itemgetter(0), leads_with_dates))
+            if all(map(operator.ge, dates, dates[1:])):
+                most_recent = leads_with_dates[:limit]
+            else:
+                most_recent = heapq.nlargest(limit, leads_with_dates, key=operator.itemgetter(0))
 
-            # Remove campo temporário
-            for lead in leads_with_dates:
-                if '_date_obj' in lead:
-                    del lead['_date_obj']
-
-            # Combina: leads com data (ordenados) + leads sem data
-            leads_sorted = leads_with_dates + leads_without_dates
-
-            # Agora sim, pega apenas o limite solicitado
-            leads_collected = leads_sorted[:limit]
+            # Combina: leads com data (ordenados) + leads sem data, até o limite
+            leads_collected = [lead for _, lead in most_recent]
+            leads_collected.extend(leads_without_dates[:limit - len(leads_collected)])
             
             result = {
                 "status": "success",
@@ -308,18 +391,108 @@ class CVDWConnector:
             }
             
             # Cache simples
-            self.simple_cache[cache_key] = {
+            self._store_simple_cache(cache_key, {
                 'data': result,
-                'timestamp': time.time()
-            }
+                'timestamp': time.time(),
+                'etag': first_page_validators[0],
+                'last_modified': first_page_validators[1]
+            })
             
             return result
             
         except Exception as e:
+            if cached_data:
+                return self._stale_result(cached_data, str(e))
             return {
                 "status": "error", 
                 "message": f"Erro ao buscar leads: {str(e)}"
             }
+        finally:
+            # Não bloqueia em páginas antecipadas que não serão usadas e cancela as que
+            # ainda não começaram (evita novas requisições/retries contra a API limitada)
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _stale_result(self, cached_data: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Resultado expirado do cache simples, servido quando a API falha (stale-if-error)"""
+        
+        age = time.time() - cached_data['timestamp']
+        if age > self.stale_if_error_timeout:
+            return {
+                "status": "error",
+                "message": f"Erro ao buscar leads: {reason}"
+            }
+        
+        logger.warning("[CONNECTOR] API indisponível (%s) - servindo cache simples de %ds atrás", reason, age)
+        
+        result = dict(cached_data['data'])
+        result['metadata'] = {**result.get('metadata', {}), "stale": True, "stale_age_seconds": int(age)}
+        return result
+    
+    def _store_simple_cache(self, cache_key: str, entry: Dict[str, Any]):
+        """Grava no cache simples com despejo LRU e limpeza de expirados"""
+        
+        with self._simple_cache_lock:
+            # Além da janela de stale-if-error, expirados sem validadores não servem mais - descarta
+            now = time.time()
+            expired = [
+                key for key, cached in self.simple_cache.items()
+                if now - cached['timestamp'] >= self.stale_if_error_timeout
+                and not (cached.get('etag') or cached.get('last_modified'))
+            ]
+            for key in expired:
+                del self.simple_cache[key]
+            
+            self.simple_cache[cache_key] = entry
+            self.simple_cache.move_to_end(cache_key)
+            
+            while len(self.simple_cache) > self.simple_cache_max:
+                self.simple_cache.popitem(last=False)
+    
+    def _simple_cache_size(self) -> int:
+        """Quantidade de entradas no cache simples (sob o lock)"""
+        with self._simple_cache_lock:
+            return len(self.simple_cache)
+    
+    def _clear_simple_cache(self):
+        """Esvazia o cache simples (sob o lock)"""
+        with self._simple_cache_lock:
+            self.simple_cache.clear()
+    
+    def _request_leads_page(self, page: int, records_per_page: int,
+                            extra_headers: Optional[Dict[str, str]] = None,
+                            stream: bool = False):
+        """Requisição de uma página de leads (segura para uso em threads)"""
+        
+        return self.session.get(
+            f"{self.base_url}/leads",
+            headers=extra_headers,
+            params={
+                "registros_por_pagina": records_per_page,
+                "pagina": page
+            },
+            timeout=30,
+            stream=stream
+        )
+    
+    def _fetch_leads_page(self, page: int, records_per_page: int) -> Tuple[int, List[Dict]]:
+        """Busca e decodifica uma página, retornando (status HTTP, leads)
+        
+        Com ijson disponível, os leads de 'dados' são lidos direto do stream,
+        sem montar o documento inteiro da página em memória.
+        """
+        
+        response = self._request_leads_page(page, records_per_page, stream=ijson is not None)
+        try:
+            if response.status_code != 200:
+                return response.status_code, []
+            
+            if ijson is None:
+                return 200, response_json(response).get('dados') or []
+            
+            response.raw.decode_content = True  # descomprime gzip/deflate no stream
+            return 200, list(ijson.items(response.raw, 'dados.item', use_float=True))
+        finally:
+            response.close()
     
     def analyze_leads(self, leads: List[Dict], query_type: str = "general") -> List[str]:
         """Analisa leads e gera insights"""
@@ -330,40 +503,22 @@ class CVDWConnector:
         insights = []
         insights.append(f"Total de leads analisados: {len(leads)}")
         
-        # Análise por situação
-        situacoes = {}
-        origens = {}
-        responsaveis = {}
-        
-        for lead in leads:
-            # Situações
-            situacao = lead.get('situacao', 'Não informado')
-            situacoes[situacao] = situacoes.get(situacao, 0) + 1
-            
-            # Origens
-            origem = lead.get('origem_nome', lead.get('origem', 'Não informado'))
-            origens[origem] = origens.get(origem, 0) + 1
-            
-            # Responsáveis (verifica múltiplos campos)
-            responsavel = (lead.get('corretor') or 
-                         lead.get('responsavel') or 
-                         lead.get('gestor') or 
-                         lead.get('vendedor') or 
-                         'Não informado')
-            responsaveis[responsavel] = responsaveis.get(responsavel, 0) + 1
-        
         # Top situações
-        if situacoes:
-            top_situacoes = sorted(situacoes.items(), key=lambda x: x[1], reverse=True)[:3]
-            insights.append(f"Top situações: {', '.join([f'{s}: {c}' for s, c in top_situacoes])}")
+        situacoes = Counter(lead.get('situacao', 'Não informado') for lead in leads)
+        top_situacoes = situacoes.most_common(3)
+        insights.append(f"Top situações: {', '.join([f'{s}: {c}' for s, c in top_situacoes])}")
         
         # Análises específicas baseadas no tipo de query
-        if "origem" in query_type.lower() and origens:
-            top_origens = sorted(origens.items(), key=lambda x: x[1], reverse=True)[:3]
+        query_words = set(re.findall(r"[a-z]+", query_type.lower()))
+        
+        if _ORIGEM_TOKENS & query_words:
+            origens = Counter(lead.get('origem_nome', lead.get('origem', 'Não informado')) for lead in leads)
+            top_origens = origens.most_common(3)
             insights.append(f"Top origens: {', '.join([f'{o}: {c}' for o, c in top_origens])}")
         
-        if any(word in query_type.lower() for word in ["sdr", "responsavel", "corretor"]) and responsaveis:
-            top_responsaveis = sorted(responsaveis.items(), key=lambda x: x[1], reverse=True)[:3]
+        if _RESP_TOKENS & query_words:
+            responsaveis = Counter(_responsavel(lead) for lead in leads)
+            top_responsaveis = responsaveis.most_common(3)
             insights.append(f"Top responsáveis: {', '.join([f'{r}: {c}' for r, c in top_responsaveis])}")
         
         return insights
@@ -373,7 +528,7 @@ class CVDWConnector:
         
         status = {
             "cache_enabled": self.cache_enabled,
-            "simple_cache_entries": len(self.simple_cache)
+            "simple_cache_entries": self._simple_cache_size()
         }
         
         if self.cache_enabled and self.daily_cache:
@@ -394,27 +549,27 @@ class CVDWConnector:
                 result = self.daily_cache.force_refresh()
                 
                 # Limpa cache simples também
-                self.simple_cache.clear()
+                self._clear_simple_cache()
                 
-                print("[CONNECTOR] Cache refresh forçado - próxima consulta coletará dados novos")
+                logger.info("[CONNECTOR] Cache refresh forçado - próxima consulta coletará dados novos")
                 return result
             except Exception as e:
-                print(f"[CONNECTOR] Erro no refresh: {str(e)}")
+                logger.error("[CONNECTOR] Erro no refresh: %s", e)
                 return False
         else:
             # Apenas limpa cache simples
-            self.simple_cache.clear()
-            print("[CONNECTOR] Cache simples limpo")
+            self._clear_simple_cache()
+            logger.info("[CONNECTOR] Cache simples limpo")
             return True
     
-    def get_complete_dataframe(self) -> Optional:
-        """Retorna DataFrame completo do cache diário"""
+    def get_complete_dataframe(self, columns: Optional[List[str]] = None) -> Optional:
+        """Retorna DataFrame completo do cache diário (opcionalmente só algumas colunas)"""
         
         if self.cache_enabled and self.daily_cache:
             try:
-                return self.daily_cache.get_leads_dataframe()
+                return self.daily_cache.get_leads_dataframe(columns)
             except Exception as e:
-                print(f"[CONNECTOR] Erro ao obter DataFrame: {str(e)}")
+                logger.error("[CONNECTOR] Erro ao obter DataFrame: %s", e)
                 return None
         return None
 
@@ -2,16 +2,66 @@
 Analisador Corrigido - CVDW
 Corrige as discrepâncias identificadas comparando com Power BI
 """
+import functools
+import logging
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from collections import Counter
 import re
 
+logger = logging.getLogger(__name__)
+
+
+def _in_analysis_session(method):
+    """Executa o método dentro de uma sessão de análise (um único "agora")"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.analysis_session(self._now):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class CorrectedCVDWAnalyzer:
     """Analisador corrigido para bater com dados do Power BI"""
     
+    # Formatos de data_cad aceitos, do mais comum (API) ao menos comum
+    DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+    
+    # Categorias de situação, em ordem de prioridade (venda vence reserva etc.)
+    SITUACAO_CATEGORIES = ("venda", "reserva", "atendimento", "negociacao")
+    
+    # Uma única regex marca todas as categorias presentes na situação: cada
+    # lookahead opcional captura seu grupo se o termo aparecer em qualquer posição
+    SITUACAO_PATTERN = re.compile(
+        r"^(?=.*?(?P<venda>venda|vendido|sold))?"
+        r"(?=.*?(?P<reserva>reserva))?"
+        r"(?=.*?(?P<atendimento>atendimento|contato|follow))?"
+        r"(?=.*?(?P<negociacao>negociação|negociacao))?",
+        re.IGNORECASE | re.DOTALL
+    )
+    
+    # Referências do Power BI usadas nas comparações
+    POWERBI_RESP_REF = {"Lucia AL": 384, "Luana AL": 256, "Vagner F": 119}
+    POWERBI_ORIG_REF = {
+        "Facebook": 495, 
+        "Instagram": 279, 
+        "Meta Org": 45,
+        "WhatsApp": 54,
+        "Ugello": 7,
+        "Portal": 2
+    }
+    
     def __init__(self):
+        # Datas convertidas da última lista de leads analisada
+        self._dates_cache = None
+        # Leads filtrados por período, para a mesma lista: (leads, {(tamanho, início, fim): filtrados})
+        self._filter_cache = (None, {})
+        # Instante de referência da sessão de análise em andamento (None = fora de sessão)
+        self._now = None
+        
         # Mapeamento de responsáveis padronizado (baseado no Power BI)
         self.responsavel_mapping = {
             # Padrão: nome_completo -> nome_padronizado
@@ -78,8 +128,46 @@ class CorrectedCVDWAnalyzer:
         # Retorna original capitalizado se não encontrou
         return str(origem).title()
     
-    def filter_leads_by_period(self, leads: List[Dict], period_days: int = 30, focus_previous_month: bool = True) -> List[Dict]:
-        """Filtra leads por período, priorizando mês anterior fechado"""
+    @contextmanager
+    def analysis_session(self, now: Optional[datetime] = None):
+        """Fixa um único instante de referência para as análises dentro do bloco
+
+        Períodos e datas de análise passam a usar o mesmo "agora" (padrão:
+        datetime.now() na entrada), o que também torna os resultados reproduzíveis.
+
+            with analyzer.analysis_session() as now:
+                analyzer.get_monthly_summary(leads)
+                analyzer.analyze_comprehensive(leads)
+        """
+
+        previous = self._now
+        self._now = now or datetime.now()
+        try:
+            yield self._now
+        finally:
+            self._now = previous
+
+    def _current_time(self) -> datetime:
+        """Instante de referência da sessão, ou o horário atual fora dela"""
+        return self._now or datetime.now()
+
+    @staticmethod
+    def _map_unique(values: pd.Series, normalizer) -> pd.Series:
+        """Aplica o normalizador uma vez por valor distinto e propaga via map"""
+        
+        lookup = {value: normalizer(value) for value in values.unique()}
+        return values.map(lookup)
+    
+    def filter_leads_by_period(self, leads: List[Dict], period_days: int = 30, focus_previous_month: bool = True,
+                               return_type: str = "list"):
+        """Filtra leads por período, priorizando mês anterior fechado
+
+        return_type="df" devolve um DataFrame com os leads do período em vez da lista.
+        """
+
+        if return_type == "df":
+            filtered = self.filter_leads_by_period(leads, period_days, focus_previous_month)
+            return pd.DataFrame(filtered) if filtered else pd.DataFrame()
 
         if not leads:
             return []
@@ -87,68 +175,82 @@ class CorrectedCVDWAnalyzer:
         # Define período baseado no foco
         if focus_previous_month:
             # Mês anterior fechado (ex: se estamos em setembro, pega agosto)
-            current_date = datetime.now()
-            if current_date.month == 1:
-                # Janeiro -> pega dezembro do ano anterior
-                start_date = datetime(current_date.year - 1, 12, 1)
-                end_date = datetime(current_date.year, 1, 1) - timedelta(days=1)
-            else:
-                # Outros meses -> pega mês anterior
-                start_date = datetime(current_date.year, current_date.month - 1, 1)
-                if current_date.month == 12:
-                    end_date = datetime(current_date.year + 1, 1, 1) - timedelta(days=1)
-                else:
-                    end_date = datetime(current_date.year, current_date.month, 1) - timedelta(days=1)
-
-            print(f"[ANALYZER] Período mês anterior: {start_date.strftime('%Y-%m-%d')} até {end_date.strftime('%Y-%m-%d')}")
+            # Dia anterior ao início do mês atual = último dia do mês anterior (vale na virada do ano)
+            current_date = self._current_time()
+            month_start = datetime(current_date.year, current_date.month, 1)
+            end_date = month_start - timedelta(days=1)
+            start_date = end_date.replace(day=1)
+
+            logger.debug("[ANALYZER] Período mês anterior: %s até %s", start_date.date(), end_date.date())
         else:
             # Método original (últimos N dias)
-            cutoff_date = datetime.now() - timedelta(days=period_days)
-            start_date = cutoff_date
-            end_date = datetime.now()
-            print(f"[ANALYZER] Período últimos {period_days} dias: {start_date.strftime('%Y-%m-%d')} até {end_date.strftime('%Y-%m-%d')}")
-
-        filtered_leads = []
-
-        for lead in leads:
-            data_cad = lead.get('data_cad')
-            if data_cad:
-                try:
-                    # Tenta diferentes formatos de data
-                    lead_date = None
-                    date_formats = [
-                        "%Y-%m-%d %H:%M:%S",
-                        "%Y-%m-%d",
-                        "%d/%m/%Y %H:%M:%S",
-                        "%d/%m/%Y"
-                    ]
-
-                    for fmt in date_formats:
-                        try:
-                            lead_date = datetime.strptime(data_cad, fmt)
-                            break
-                        except ValueError:
-                            continue
-
-                    if lead_date and start_date <= lead_date <= end_date:
-                        filtered_leads.append(lead)
-
-                except Exception:
-                    # Se erro na data, inclui para ser conservador
-                    filtered_leads.append(lead)
-            else:
-                # Se não tem data, inclui
-                filtered_leads.append(lead)
-
-        return filtered_leads
+            end_date = self._current_time()
+            start_date = end_date - timedelta(days=period_days)
+            logger.debug("[ANALYZER] Período últimos %d dias: %s até %s", period_days, start_date.date(), end_date.date())
+
+        # Mesma lista e mesmo período (resumo mensal + análise abrangente): reaproveita
+        cache_key = (len(leads), start_date, end_date)
+        cached_leads, filtered_by_period = self._filter_cache
+        if cached_leads is leads and cache_key in filtered_by_period:
+            return filtered_by_period[cache_key]
 
+        raw_dates, lead_dates = self._parse_lead_dates(leads)
+
+        # Leads sem data são incluídos; com data, só os que caem no período
+        has_date = raw_dates.notna() & (raw_dates != '')
+        mask = ~has_date | lead_dates.between(start_date, end_date)
+
+        filtered = [lead for lead, keep in zip(leads, mask.tolist()) if keep]
+
+        if cached_leads is not leads:
+            self._filter_cache = (leads, {})
+        self._filter_cache[1][cache_key] = filtered
+        return filtered
+
+    def _parse_lead_dates(self, leads: List[Dict]):
+        """Converte data_cad de todos os leads de uma vez (vetorizado)
+
+        Retorna (valores originais, datas). O resultado fica guardado para a mesma
+        lista de leads, evitando reprocessar quando várias análises a filtram.
+        """
+
+        cached = self._dates_cache
+        if cached is not None and cached[0] is leads and len(cached[1]) == len(leads):
+            return cached[1], cached[2]
+
+        raw_dates = pd.Series([lead.get('data_cad') for lead in leads], dtype=object)
+
+        # Formato da API primeiro; demais formatos só para o que não converteu
+        lead_dates = pd.to_datetime(raw_dates, format=self.DATE_FORMATS[0], errors='coerce')
+        for fmt in self.DATE_FORMATS[1:]:
+            pending = lead_dates.isna() & raw_dates.notna()
+            if not pending.any():
+                break
+            lead_dates[pending] = pd.to_datetime(raw_dates[pending], format=fmt, errors='coerce')
+
+        self._dates_cache = (leads, raw_dates, lead_dates)
+        return raw_dates, lead_dates
+
+    def _categorize_situacoes(self, situacoes: pd.Series) -> pd.Series:
+        """Classifica cada situação na categoria de maior prioridade (ou None)
+
+        Uma varredura da regex por valor; o primeiro grupo presente, na ordem de
+        SITUACAO_CATEGORIES, define a categoria.
+        """
+
+        flags = (situacoes.fillna('').astype(str)
+                 .str.extract(self.SITUACAO_PATTERN)
+                 .notna()[list(self.SITUACAO_CATEGORIES)])
+        return flags.idxmax(axis=1).where(flags.any(axis=1))
+
+    @_in_analysis_session
     def get_monthly_summary(self, leads: List[Dict], focus_previous_month: bool = True) -> Dict[str, Any]:
         """Retorna resumo mensal focado no mês anterior fechado"""
 
         # Prioriza mês anterior fechado para análise mais precisa
-        print(f"[ANALYZER] Iniciando análise com {len(leads)} leads totais")
+        logger.info("[ANALYZER] Iniciando análise com %d leads totais", len(leads))
         recent_leads = self.filter_leads_by_period(leads, period_days=30, focus_previous_month=focus_previous_month)
-        print(f"[ANALYZER] Após filtro: {len(recent_leads)} leads do período")
+        logger.info("[ANALYZER] Após filtro: %d leads do período", len(recent_leads))
 
         # Define período para exibição
         period_label = "Mês anterior fechado" if focus_previous_month else "Últimos 30 dias"
@@ -165,28 +267,24 @@ class CorrectedCVDWAnalyzer:
 
         # Contadores principais
         total_leads = len(recent_leads)
-        vendas = 0
-        reservas = 0
-        em_negociacao = 0
 
-        # Análise por situação
-        for lead in recent_leads:
-            situacao = str(lead.get('situacao', '')).upper()
+        # Análise por situação: categoriza os valores distintos e soma as contagens
+        situacoes = Counter(lead.get('situacao') for lead in recent_leads)
+        situacoes_series = pd.Series(list(situacoes.values()), index=list(situacoes.keys()), dtype='int64')
+        categorias = self._categorize_situacoes(situacoes_series.index.to_series())
+        por_categoria = situacoes_series.groupby(categorias.values).sum()
 
-            if any(term in situacao for term in ['VENDA', 'VENDIDO', 'SOLD']):
-                vendas += 1
-            elif 'RESERVA' in situacao:
-                reservas += 1
-            elif any(term in situacao for term in ['NEGOCIAÇÃO', 'NEGOCIACAO', 'FOLLOW', 'ATENDIMENTO', 'CONTATO']):
-                em_negociacao += 1
+        vendas = int(por_categoria.get('venda', 0))
+        reservas = int(por_categoria.get('reserva', 0))
+        em_negociacao = int(por_categoria.get('atendimento', 0) + por_categoria.get('negociacao', 0))
 
-        # Top origens
-        origens_count = {}
-        for lead in recent_leads:
-            origem = self.normalize_origem_name(lead.get('origem_nome', 'N/A'))
-            origens_count[origem] = origens_count.get(origem, 0) + 1
+        # Top origens: conta as origens brutas e normaliza uma vez por valor distinto
+        origens_raw = Counter(lead.get('origem_nome', 'N/A') for lead in recent_leads)
+        origens_count = Counter()
+        for origem, count in origens_raw.items():
+            origens_count[self.normalize_origem_name(origem)] += count
 
-        top_origens = sorted(origens_count.items(), key=lambda x: x[1], reverse=True)[:3]
+        top_origens = origens_count.most_common(3)
 
         # Taxa de conversão
         taxa_vendas = round((vendas / total_leads) * 100, 2) if total_leads > 0 else 0
@@ -202,7 +300,7 @@ class CorrectedCVDWAnalyzer:
                 "taxa_vendas": taxa_vendas,
                 "taxa_reservas": taxa_reservas,
                 "top_origens": top_origens,
-                "data_analise": datetime.now().strftime("%d/%m/%Y %H:%M")
+                "data_analise": self._current_time().strftime("%d/%m/%Y %H:%M")
             }
         except Exception as e:
             return {
@@ -214,10 +312,11 @@ class CorrectedCVDWAnalyzer:
                 "taxa_vendas": 0.0,
                 "taxa_reservas": 0.0,
                 "top_origens": [],
-                "data_analise": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                "data_analise": self._current_time().strftime("%d/%m/%Y %H:%M"),
                 "error": str(e)
             }
     
+    @_in_analysis_session
     def analyze_comprehensive(self, leads: List[Dict]) -> Dict[str, Any]:
         """Análise abrangente comparável ao Power BI"""
         
@@ -225,26 +324,28 @@ class CorrectedCVDWAnalyzer:
             return {"error": "Nenhum lead para análise"}
         
         # Filtra por período (últimos 30 dias como exemplo)
-        recent_leads = self.filter_leads_by_period(leads, period_days=30)
-        
-        df = pd.DataFrame(leads)
-        df_recent = pd.DataFrame(recent_leads) if recent_leads else pd.DataFrame()
+        df_recent = self.filter_leads_by_period(leads, period_days=30, return_type="df")
+        total_recent = len(df_recent)
         
         analysis = {
             "overview": {
                 "total_leads_base": len(leads),
-                "leads_periodo_recente": len(recent_leads),
+                "leads_periodo_recente": total_recent,
                 "periodo_analise": "Últimos 30 dias",
-                "data_analise": datetime.now().strftime("%d/%m/%Y %H:%M")
+                "data_analise": self._current_time().strftime("%d/%m/%Y %H:%M")
             },
             "leads_novos": {
-                "total": len(recent_leads),
+                "total": total_recent,
                 "comparacao_powerbi": 936,  # Valor de referência
-                "diferenca_percentual": round(((len(recent_leads) - 936) / 936) * 100, 2) if len(recent_leads) > 0 else -100
+                "diferenca_percentual": round(((total_recent - 936) / 936) * 100, 2) if total_recent > 0 else -100
             }
         }
         
-        if len(df_recent) > 0:
+        if total_recent > 0:
+            # Categoria de situação calculada uma vez, reaproveitada nas conversões
+            if 'situacao' in df_recent.columns:
+                df_recent['_sit_cat'] = self._categorize_situacoes(df_recent['situacao'])
+            
             # Análise por responsável (padronizado)
             responsaveis_analysis = self._analyze_responsaveis(df_recent)
             analysis["responsaveis"] = responsaveis_analysis
@@ -283,15 +384,15 @@ class CorrectedCVDWAnalyzer:
         if best_data is None:
             return {"error": "Nenhum campo de responsável encontrado"}
         
-        # Normaliza nomes
-        normalized_names = best_data.apply(self.normalize_responsavel_name)
+        # Normaliza nomes: variações de caixa/espaços do mesmo nome viram uma chave só,
+        # e o normalizador roda uma vez por chave distinta
+        name_keys = best_data.astype(str).str.lower().str.strip()
+        normalized_names = self._map_unique(name_keys, self.normalize_responsavel_name)
         responsaveis_count = normalized_names.value_counts()
         
         # Compara com Power BI
-        powerbi_ref = {"Lucia AL": 384, "Luana AL": 256, "Vagner F": 119}
-        
         comparison = {}
-        for sdr, count_pb in powerbi_ref.items():
+        for sdr, count_pb in self.POWERBI_RESP_REF.items():
             count_nossa = responsaveis_count.get(sdr, 0)
             comparison[sdr] = {
                 "power_bi": count_pb,
@@ -316,21 +417,12 @@ class CorrectedCVDWAnalyzer:
         
         # Normaliza origens
         origem_data = df[origem_field].dropna()
-        normalized_origens = origem_data.apply(self.normalize_origem_name)
+        normalized_origens = self._map_unique(origem_data, self.normalize_origem_name)
         origens_count = normalized_origens.value_counts()
         
         # Compara com Power BI
-        powerbi_ref = {
-            "Facebook": 495, 
-            "Instagram": 279, 
-            "Meta Org": 45,
-            "WhatsApp": 54,
-            "Ugello": 7,
-            "Portal": 2
-        }
-        
         comparison = {}
-        for origem, count_pb in powerbi_ref.items():
+        for origem, count_pb in self.POWERBI_ORIG_REF.items():
             count_nossa = origens_count.get(origem, 0)
             comparison[origem] = {
                 "power_bi": count_pb,
@@ -352,20 +444,13 @@ class CorrectedCVDWAnalyzer:
         
         situacoes = df['situacao'].value_counts()
         
-        # Categoriza situações
-        vendas = 0
-        reservas = 0
-        em_atendimento = 0
+        # Categoriza só os valores distintos e soma as contagens por categoria
+        categorias = self._categorize_situacoes(situacoes.index.to_series())
+        por_categoria = situacoes.groupby(categorias.values).sum()
         
-        for situacao, count in situacoes.items():
-            situacao_lower = str(situacao).lower()
-            
-            if any(word in situacao_lower for word in ['venda', 'vendido', 'sold']):
-                vendas += count
-            elif 'reserva' in situacao_lower:
-                reservas += count
-            elif any(word in situacao_lower for word in ['atendimento', 'contato', 'follow']):
-                em_atendimento += count
+        vendas = int(por_categoria.get('venda', 0))
+        reservas = int(por_categoria.get('reserva', 0))
+        em_atendimento = int(por_categoria.get('atendimento', 0))
         
         total = len(df)
         
@@ -387,19 +472,24 @@ class CorrectedCVDWAnalyzer:
         if 'situacao' not in df.columns:
             return {"error": "Campo situacao necessário para análise de conversões"}
         
-        vendas = df[df['situacao'].str.contains('VENDA|VENDIDO', na=False, case=False)]
-        reservas = df[df['situacao'].str.contains('RESERVA', na=False, case=False)]
+        if '_sit_cat' in df.columns:
+            categorias = df['_sit_cat']
+        else:
+            categorias = self._categorize_situacoes(df['situacao'])
+        
+        vendas = int((categorias == 'venda').sum())
+        reservas = int((categorias == 'reserva').sum())
         
-        taxa_conversao_vendas = (len(vendas) / total_leads) * 100 if total_leads > 0 else 0
-        taxa_conversao_reservas = (len(reservas) / total_leads) * 100 if total_leads > 0 else 0
+        taxa_conversao_vendas = (vendas / total_leads) * 100 if total_leads > 0 else 0
+        taxa_conversao_reservas = (reservas / total_leads) * 100 if total_leads > 0 else 0
         
         return {
             "vendas": {
-                "total": len(vendas),
+                "total": vendas,
                 "taxa": round(taxa_conversao_vendas, 2)
             },
             "reservas": {
-                "total": len(reservas), 
+                "total": reservas, 
                 "taxa": round(taxa_conversao_reservas, 2)
             },
             "taxa_conversao_total": round(taxa_conversao_vendas + taxa_conversao_reservas, 2)
@@ -0,0 +1,169 @@
+"""
+Utilitários HTTP compartilhados pelos clientes da API CVDW
+Sessão com keep-alive, compressão, retry automático e decodificação JSON rápida
+"""
+import json
+import random
+import threading
+import time
+import requests
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    # json.loads também aceita bytes
+    json_loads = json.loads
+
+    def json_dumps(obj: Any) -> bytes:
+        """Serializa em JSON UTF-8 (mesmo retorno em bytes do orjson)"""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def create_session(headers: Dict[str, str],
+                   pool_connections: int = 4,
+                   pool_maxsize: int = 8,
+                   pool_block: bool = False,
+                   total_retries: int = 3,
+                   backoff_factor: float = 0.5,
+                   backoff_jitter: float = 1.0,
+                   status_forcelist: Iterable[int] = (502, 503, 504)) -> requests.Session:
+    """Cria sessão HTTP reutilizável para a API CVDW
+
+    A sessão mantém a conexão TLS aberta entre requisições (keep-alive),
+    pede respostas comprimidas e repete automaticamente os status informados,
+    com backoff exponencial + jitter (ou o Retry-After enviado pelo servidor).
+    Esgotadas as tentativas, a última resposta é devolvida ao chamador.
+    """
+
+    session = requests.Session()
+    session.headers.update(headers)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    retry_options = dict(
+        total=total_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=list(status_forcelist),
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    try:
+        retry = Retry(backoff_jitter=backoff_jitter, **retry_options)
+    except TypeError:
+        # urllib3 < 2.0 não suporta jitter
+        retry = Retry(**retry_options)
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=retry
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)  # serviços locais (ex.: Ollama)
+
+    return session
+
+
+def response_json(response: requests.Response) -> Any:
+    """Decodifica o corpo JSON da resposta (orjson quando instalado)"""
+    return json_loads(response.content)
+
+
+def retry_after_seconds(response: requests.Response, max_delay: float = 300.0) -> Optional[float]:
+    """Espera indicada pelo header Retry-After (segundos ou data HTTP)
+
+    Aplica jitter de +-20% para que clientes concorrentes não voltem juntos
+    e limita a max_delay. Retorna None se o header estiver ausente ou inválido.
+    """
+
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at is None:
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+
+    delay = max(0.0, delay) * random.uniform(0.8, 1.2)
+    return min(max_delay, delay)
+
+
+class AdaptiveThrottle:
+    """Ritmo adaptativo entre requisições, compartilhado entre threads
+
+    O intervalo base diminui a cada resposta 200 e aumenta a cada 429. Sobre ele
+    incide a densidade recente de 429 (janela deslizante): quanto mais rate limits
+    nos últimos window_seconds, maior o espaçamento entre requisições.
+    """
+
+    def __init__(self, base_interval: float = 0.2, min_interval: float = 0.1,
+                 max_interval: float = 5.0, alpha: float = 4.0, window_seconds: float = 60.0):
+        self.interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.window_seconds = window_seconds
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._recent_requests = deque()
+        self._recent_rate_limits = deque()
+
+    def wait(self):
+        """Bloqueia até o próximo horário livre para enviar uma requisição"""
+
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.current_delay()
+            self._recent_requests.append(slot)
+
+        if slot > now:
+            time.sleep(slot - now)
+
+    def current_delay(self) -> float:
+        """Intervalo atual, ponderado pela proporção recente de 429"""
+
+        ratio = len(self._recent_rate_limits) / max(1, len(self._recent_requests))
+        delay = self.interval * (1 + self.alpha * ratio)
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    def on_success(self):
+        """Resposta 200: acelera gradualmente"""
+
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * 0.95)
+
+    def on_rate_limited(self):
+        """Resposta 429: desacelera e registra na janela"""
+
+        with self._lock:
+            self._recent_rate_limits.append(time.monotonic())
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def _trim(self, now: float):
+        """Descarta eventos fora da janela deslizante"""
+
+        limit = now - self.window_seconds
+        for events in (self._recent_requests, self._recent_rate_limits):
+            while events and events[0] < limit:
+                events.popleft()
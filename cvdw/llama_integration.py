@@ -2,19 +2,165 @@
 Integração Ollama/Llama - Processamento inteligente de respostas
 Melhora as respostas do agente com IA local
 """
+import hashlib
+import importlib.util
 import json
-import requests
-from typing import Dict, List, Any, Optional
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+from .http_utils import create_session, json_dumps, response_json
+
+# sentence-transformers (opcional) traz torch: só é importado no primeiro uso do cache semântico
+SEMANTIC_CACHE_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+
+# Partes fixas dos prompts. Ficam no início para que chamadas seguidas compartilhem
+# o mesmo prefixo e o Ollama reaproveite o KV cache já calculado para ele.
+ENHANCE_PROMPT_PREFIX = """Você é um especialista em análise de dados de marketing imobiliário.
+
+Sua tarefa:
+1. Forneça uma resposta clara e objetiva
+2. Destaque insights importantes
+3. Use linguagem profissional mas acessível
+4. Inclua números específicos quando relevante
+5. Sugira próximos passos se apropriado
+
+"""
+
+INSIGHTS_PROMPT_PREFIX = """Analise os dados de leads imobiliários abaixo e gere insights valiosos.
+
+Gere 3-5 insights práticos e acionáveis baseados nestes dados. Foque em:
+- Padrões interessantes
+- Oportunidades de melhoria
+- Recomendações estratégicas
+
+Formato: Lista de insights curtos e objetivos.
+
+"""
+
+CLASSIFY_PROMPT_PREFIX = """Analise a consulta sobre dados de marketing imobiliário abaixo e classifique.
+
+Classifique em uma das categorias:
+- QUANTITATIVO: Perguntas sobre números, totais, contagens
+- PERFORMANCE: Análise de desempenho, rankings, comparações
+- TEMPORAL: Consultas sobre períodos, datas, tendências
+- ORIGEM: Análise de canais, fontes, campanhas
+- SITUACAO: Status de leads, funil de vendas
+- RESPONSAVEL: Performance de equipe, SDRs, corretores
+- GERAL: Consultas gerais ou explorações
+
+Responda APENAS a categoria, sem explicações.
+
+"""
+
+# Categorias aceitas na classificação de consultas
+VALID_CATEGORIES = ("QUANTITATIVO", "PERFORMANCE", "TEMPORAL", "ORIGEM", "SITUACAO", "RESPONSAVEL", "GERAL")
+
+# Modelos menores/quantizados por tarefa (decodificação mais rápida na CPU). Opcional:
+# validar antes com `python tests/test_cvdw.py --avaliar-llama` (>= 95% de concordância)
+FAST_TASK_MODELS = {
+    "classify": "qwen2.5:0.5b-instruct-q4_K_M",
+    "enhance": "llama3.2:3b-instruct-q4_0",
+    "insights": "phi3:mini-4k-instruct-q4_K_M"
+}
+
+# Vocabulário por categoria de consulta (classificação sem IA)
+CATEGORY_KEYWORDS = {
+    "QUANTITATIVO": ["quantos", "quantas", "quantidade", "total", "totais", "número", "numero", "contagem"],
+    "PERFORMANCE": ["performance", "desempenho", "ranking", "comparar", "comparação", "comparacao",
+                    "melhor", "melhores", "pior", "piores", "conversão", "conversao", "taxa"],
+    "TEMPORAL": ["mês", "mes", "mensal", "semana", "semanal", "hoje", "ontem", "ano", "anual",
+                 "período", "periodo", "tendência", "tendencia", "último", "ultimo", "anterior"],
+    "ORIGEM": ["origem", "origens", "canal", "canais", "campanha", "campanhas", "mídia", "midia",
+               "facebook", "instagram", "whatsapp"],
+    "SITUACAO": ["situação", "situacao", "situações", "situacoes", "status", "funil",
+                 "venda", "vendas", "reserva", "reservas", "atendimento"],
+    "RESPONSAVEL": ["sdr", "sdrs", "responsável", "responsavel", "responsáveis", "responsaveis",
+                    "corretor", "corretores", "equipe", "gestor", "vendedor", "vendedores"]
+}
+
+# Uma regex compilada por categoria, montada uma vez na importação
+CATEGORY_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(map(re.escape, keywords)) + r")\b", re.IGNORECASE)
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
 
 class OllamaIntegration:
     """Integração com Ollama para processamento de linguagem natural"""
     
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.2:3b"):
-        """Inicializa integração Ollama"""
+    # Cabeçalho do corpo já serializado enviado ao /api/generate
+    _JSON_HEADERS = {"Content-Type": "application/json"}
+    
+    # Opções de geração por tarefa (constantes, reaproveitadas em todas as chamadas)
+    # e rodapé do enhance_response
+    ENHANCE_OPTIONS = {
+        "temperature": 0.3,  # Mais conservador para dados
+        "top_p": 0.9,
+        "max_tokens": 512
+    }
+    INSIGHTS_OPTIONS = {
+        "temperature": 0.4,
+        "top_p": 0.9,
+        "max_tokens": 300
+    }
+    CLASSIFY_OPTIONS = {
+        "temperature": 0.1,  # Muito conservador para classificação
+        "max_tokens": 20
+    }
+    ENHANCE_FOOTER = "\n\n---\n📊 Fonte: API CVDW Real | Processado com IA Local"
+    
+    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.2:3b",
+                 task_models: Optional[Dict[str, str]] = None):
+        """Inicializa integração Ollama
+        
+        task_models permite um modelo por tarefa ("classify", "enhance", "insights"),
+        ex.: FAST_TASK_MODELS; tarefas não informadas usam model.
+        """
         
         self.base_url = base_url
         self.model = model
+        self.task_models = {"classify": model, "enhance": model, "insights": model}
+        self.task_models.update(task_models or {})
+        
+        # Sessão com keep-alive: reaproveita a conexão com o Ollama entre chamadas
+        self._session = create_session(
+            {},
+            pool_connections=1,
+            pool_maxsize=4,
+            total_retries=2,
+            backoff_factor=0.2
+        )
+        
+        # Cache de respostas por prompt idêntico: chave -> (texto, expira_em)
+        self.cache_ttl = 600
+        self.cache_max = 256
+        self._response_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Cache semântico do enhance_response: consultas parecidas sobre a mesma análise
+        # reaproveitam a resposta (requer sentence-transformers; modelo carregado sob demanda)
+        self.semantic_model_name = "all-MiniLM-L6-v2"
+        self.semantic_threshold = 0.92
+        self._semantic_model = None
+        self._semantic_vectors = []  # embeddings normalizados das consultas
+        self._semantic_entries = []  # (hash da análise, resposta), paralelo aos vetores
+        
+        # Contexto da última lista de leads: (leads, tamanho, texto)
+        self._context_cache = None
+        
+        # Última consulta a /api/tags: (instante, modelos ou None)
+        self._models_cache = None
+        
+        # Circuit breaker: após falhas seguidas (timeouts inclusive) as gerações ficam
+        # suspensas por circuit_cooldown segundos e as respostas usam o fallback
+        self.circuit_failure_threshold = 3
+        self.circuit_cooldown = 60.0
+        self._fail_count = 0
+        self._circuit_open_until = 0.0
+        
         self.available = self._test_connection()
         
         if self.available:
@@ -25,63 +171,207 @@ class OllamaIntegration:
     def _test_connection(self) -> bool:
         """Testa conexão com Ollama"""
         
+        return self._fetch_models() is not None
+    
+    def _fetch_models(self) -> Optional[List[str]]:
+        """Modelos instalados no Ollama (/api/tags), reaproveitados por 60s
+        
+        Retorna None se o Ollama não responder.
+        """
+        
+        now = time.monotonic()
+        if self._models_cache is not None and now - self._models_cache[0] < 60:
+            return self._models_cache[1]
+        
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=5)
+            if response.status_code != 200:
+                models = None
+            else:
+                models = [model.get("name", "") for model in response_json(response).get("models", [])]
+        except Exception:
+            models = None
+        
+        self._models_cache = (now, models)
+        return models
+    
+    def close(self):
+        """Fecha as conexões mantidas com o Ollama"""
+        
+        self._session.close()
+    
+    def _generate(self, prompt: str, options: Dict[str, Any], timeout: float,
+                  cache_key: Optional[str] = None, task: str = "enhance") -> Optional[str]:
+        """Chama /api/generate, reaproveitando respostas de prompts idênticos
+        
+        A chave padrão é o hash de modelo + prompt + opções; cache_key permite uma
+        chave própria (ex.: consulta normalizada). Retorna None em erro HTTP;
+        exceções de rede sobem para o chamador.
+        """
+        
+        model = self.task_models.get(task, self.model)
+        cache_key = self._cache_key(prompt, options, cache_key, model)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if self._circuit_open():
+            return None
+        
+        try:
+            response = self._session.post(
+                f"{self.base_url}/api/generate",
+                data=self._generate_body(model, prompt, options),
+                headers=self._JSON_HEADERS,
+                timeout=timeout
+            )
+        except Exception as e:
+            self._record_failure()
+            raise
+        
+        if response.status_code != 200:
+            self._record_failure()
+            return None
+        
+        self._record_success()
+        text = response_json(response).get("response", "").strip()
+        self._cache_put(cache_key, text)
+        return text
     
-    def enhance_response(self, user_query: str, data_analysis: str, leads_data: List[Dict]) -> str:
+    @staticmethod
+    def _generate_body(model: str, prompt: str, options: Dict[str, Any]) -> bytes:
+        """Corpo JSON do /api/generate, serializado uma vez (orjson quando instalado)"""
+        
+        return json_dumps({"model": model, "prompt": prompt, "stream": False, "options": options})
+    
+    def _circuit_open(self) -> bool:
+        """Se as gerações estão suspensas pelo circuit breaker"""
+        return time.monotonic() < self._circuit_open_until
+    
+    def _record_success(self):
+        """Geração bem-sucedida: zera a contagem de falhas"""
+        self._fail_count = 0
+    
+    def _record_failure(self):
+        """Registra falha; abre o circuito ao atingir o limite de falhas seguidas"""
+        
+        self._fail_count += 1
+        if self._fail_count >= self.circuit_failure_threshold:
+            self._circuit_open_until = time.monotonic() + self.circuit_cooldown
+            self._fail_count = 0
+            print(f"[OLLAMA] Gerações suspensas por {self.circuit_cooldown:.0f}s após falhas - usando fallback")
+    
+    def _cache_key(self, prompt: str, options: Dict[str, Any], custom_key: Optional[str] = None,
+                   model: Optional[str] = None) -> str:
+        """Chave do cache de respostas para o modelo informado (padrão: o de enhance)"""
+        
+        model = model or self.task_models["enhance"]
+        if custom_key is not None:
+            return f"{model}\0{custom_key}"
+        
+        payload_id = model + "\0" + prompt + "\0" + json.dumps(options, sort_keys=True)
+        return hashlib.blake2b(payload_id.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _cache_get(self, cache_key: str) -> Optional[str]:
+        """Resposta em cache ainda válida, ou None"""
+        
+        with self._cache_lock:
+            cached = self._response_cache.get(cache_key)
+            if cached and cached[1] > time.monotonic():
+                self._response_cache.move_to_end(cache_key)
+                return cached[0]
+        return None
+    
+    def _cache_put(self, cache_key: str, text: str):
+        """Grava resposta no cache (LRU limitado a cache_max entradas)"""
+        
+        with self._cache_lock:
+            self._response_cache[cache_key] = (text, time.monotonic() + self.cache_ttl)
+            self._response_cache.move_to_end(cache_key)
+            while len(self._response_cache) > self.cache_max:
+                self._response_cache.popitem(last=False)
+    
+    def cache_clear(self):
+        """Descarta as respostas guardadas em cache"""
+        
+        with self._cache_lock:
+            self._response_cache.clear()
+            self._semantic_vectors.clear()
+            self._semantic_entries.clear()
+    
+    def _semantic_lookup(self, query: str, analysis_hash: str) -> Tuple[Optional[str], Any]:
+        """Procura resposta de consulta semelhante para a mesma análise
+        
+        Retorna (resposta ou None, embedding da consulta para gravar depois).
+        Sem sentence-transformers retorna (None, None).
+        """
+        
+        if not SEMANTIC_CACHE_AVAILABLE:
+            return None, None
+        
+        import numpy as np
+        
+        try:
+            if self._semantic_model is None:
+                from sentence_transformers import SentenceTransformer
+                self._semantic_model = SentenceTransformer(self.semantic_model_name)
+            vector = self._semantic_model.encode(query, normalize_embeddings=True)
+        except Exception as e:
+            print(f"[OLLAMA] Cache semântico indisponível: {str(e)}")
+            return None, None
+        
+        with self._cache_lock:
+            if self._semantic_vectors:
+                # Vetores normalizados: produto interno = similaridade de cosseno
+                scores = np.stack(self._semantic_vectors) @ vector
+                for index in np.argsort(scores)[::-1]:
+                    if scores[index] < self.semantic_threshold:
+                        break
+                    cached_hash, cached_response = self._semantic_entries[index]
+                    if cached_hash == analysis_hash:
+                        return cached_response, vector
+        
+        return None, vector
+    
+    def _semantic_store(self, vector: Any, analysis_hash: str, response: str):
+        """Grava resposta no cache semântico (descarta as mais antigas além de cache_max)"""
+        
+        if vector is None:
+            return
+        
+        with self._cache_lock:
+            self._semantic_vectors.append(vector)
+            self._semantic_entries.append((analysis_hash, response))
+            if len(self._semantic_vectors) > self.cache_max:
+                del self._semantic_vectors[0]
+                del self._semantic_entries[0]
+    
+    def enhance_response(self, user_query: str, data_analysis: str, leads_data: List[Dict],
+                         query_type: Optional[str] = None) -> str:
         """Melhora resposta usando Llama"""
         
         if not self.available:
             return data_analysis  # Retorna análise original se Ollama indisponível
         
-        # Prepara contexto para Llama
-        context = self._prepare_context(user_query, data_analysis, leads_data)
+        if not self._needs_enhancement(data_analysis, query_type):
+            return data_analysis  # O número já é a resposta
         
-        # Prompt otimizado para análise de dados
-        prompt = f"""Você é um especialista em análise de dados de marketing imobiliário. 
+        # Consulta parafraseada sobre a mesma análise: reaproveita a resposta anterior
+        analysis_hash = hashlib.blake2b(data_analysis.encode("utf-8"), digest_size=16).hexdigest()
+        cached_response, query_vector = self._semantic_lookup(user_query, analysis_hash)
+        if cached_response is not None:
+            return cached_response
         
-Consulta do usuário: "{user_query}"
-
-Dados analisados:
-{data_analysis}
-
-Contexto adicional dos dados:
-{context}
-
-Sua tarefa:
-1. Forneça uma resposta clara e objetiva
-2. Destaque insights importantes
-3. Use linguagem profissional mas acessível
-4. Inclua números específicos quando relevante
-5. Sugira próximos passos se apropriado
-
-Resposta:"""
+        prompt = self._enhance_prompt(user_query, data_analysis, leads_data)
 
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,  # Mais conservador para dados
-                        "top_p": 0.9,
-                        "max_tokens": 512
-                    }
-                },
-                timeout=30
-            )
+            enhanced_text = self._generate(prompt, self.ENHANCE_OPTIONS, timeout=25)
             
-            if response.status_code == 200:
-                result = response.json()
-                enhanced_text = result.get("response", "").strip()
-                
+            if enhanced_text is not None:
                 if enhanced_text and len(enhanced_text) > 50:
-                    return f"{enhanced_text}\n\n---\n📊 Fonte: API CVDW Real | Processado com IA Local"
+                    final_text = enhanced_text + self.ENHANCE_FOOTER
+                    self._semantic_store(query_vector, analysis_hash, final_text)
+                    return final_text
                 else:
                     return data_analysis  # Fallback se resposta muito curta
             else:
@@ -91,8 +381,61 @@ Resposta:"""
             print(f"[OLLAMA] Erro: {str(e)}")
             return data_analysis  # Fallback se erro
     
+    @staticmethod
+    def _needs_enhancement(data_analysis: str, query_type: Optional[str] = None) -> bool:
+        """Se vale chamar o modelo para reescrever a análise
+        
+        Consultas quantitativas e análises curtas com números já são a resposta
+        final - a reescrita só custaria uma geração.
+        """
+        
+        if query_type == "QUANTITATIVO":
+            return False
+        return not (len(data_analysis) < 200 and any(c.isdigit() for c in data_analysis))
+    
+    def _enhance_prompt(self, user_query: str, data_analysis: str, leads_data: List[Dict]) -> str:
+        """Monta o prompt do enhance_response"""
+        
+        # Prepara contexto para Llama
+        context = self._prepare_context(user_query, data_analysis, leads_data)
+        
+        # Instruções fixas primeiro (prefixo reaproveitado no KV cache), dados variáveis no fim
+        return ENHANCE_PROMPT_PREFIX + f"""Consulta do usuário: "{user_query}"
+
+Dados analisados:
+{data_analysis}
+
+Contexto adicional dos dados:
+{context}
+
+Resposta:"""
+    
+    def enhance_with_insights(self, user_query: str, data_analysis: str, leads_data: List[Dict],
+                              analysis_type: str = "general") -> Tuple[str, List[str]]:
+        """Executa enhance_response e generate_insights em paralelo
+        
+        As duas gerações são independentes; disparadas juntas, a espera total é a
+        da mais lenta em vez da soma. Retorna (resposta melhorada, insights).
+        """
+        
+        if not self.available:
+            return data_analysis, []
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            enhanced = executor.submit(self.enhance_response, user_query, data_analysis, leads_data, analysis_type)
+            insights = executor.submit(self.generate_insights, leads_data, analysis_type)
+            return enhanced.result(), insights.result()
+    
     def _prepare_context(self, query: str, analysis: str, leads_data: List[Dict]) -> str:
-        """Prepara contexto adicional para Llama"""
+        """Prepara contexto adicional para Llama
+        
+        O contexto depende só dos leads: fica guardado para a mesma lista, que o
+        dashboard reenvia a cada consulta.
+        """
+        
+        cached = self._context_cache
+        if cached is not None and cached[0] is leads_data and cached[1] == len(leads_data or ()):
+            return cached[2]
         
         context_parts = []
         
@@ -106,17 +449,22 @@ Resposta:"""
                 sample_lead = leads_data[0]
                 context_parts.append(f"Dados disponíveis por lead: {len(sample_lead)} campos")
                 
-                # Situações únicas
-                situacoes = set(lead.get('situacao', '') for lead in leads_data[:100])  # Sample
+                # Situações e origens únicas numa só passada pela amostra
+                situacoes = set()
+                origens = set()
+                for lead in leads_data[:100]:
+                    situacoes.add(lead.get('situacao', ''))
+                    origens.add(lead.get('origem_nome', ''))
+                
                 if situacoes:
                     context_parts.append(f"Situações encontradas: {', '.join(list(situacoes)[:5])}")
                 
-                # Origens únicas
-                origens = set(lead.get('origem_nome', '') for lead in leads_data[:100])
                 if origens:
                     context_parts.append(f"Principais origens: {', '.join(list(origens)[:5])}")
         
-        return "\n".join(context_parts)
+        context = "\n".join(context_parts)
+        self._context_cache = (leads_data, len(leads_data or ()), context)
+        return context
     
     def generate_insights(self, leads_data: List[Dict], analysis_type: str = "general") -> List[str]:
         """Gera insights inteligentes usando Llama"""
@@ -130,20 +478,11 @@ Resposta:"""
         
         # Estatísticas rápidas
         total_leads = len(leads_data)
-        situacoes = {}
-        origens = {}
-        
-        for lead in sample_leads:
-            situacao = lead.get('situacao', 'Não informado')
-            origem = lead.get('origem_nome', 'Não informado')
-            
-            situacoes[situacao] = situacoes.get(situacao, 0) + 1
-            origens[origem] = origens.get(origem, 0) + 1
+        situacoes = dict(Counter(lead.get('situacao', 'Não informado') for lead in sample_leads))
+        origens = dict(Counter(lead.get('origem_nome', 'Não informado') for lead in sample_leads))
         
-        # Prepara prompt para insights
-        prompt = f"""Analise estes dados de leads imobiliários e gere insights valiosos:
-
-Total de leads: {total_leads}
+        # Prepara prompt para insights (instruções fixas primeiro, dados no fim)
+        prompt = INSIGHTS_PROMPT_PREFIX + f"""Total de leads: {total_leads}
 Amostra analisada: {sample_size} leads
 
 Situações encontradas:
@@ -152,35 +491,17 @@ Situações encontradas:
 Origens dos leads:
 {json.dumps(origens, indent=2)}
 
-Gere 3-5 insights práticos e acionáveis baseados nestes dados. Foque em:
-- Padrões interessantes
-- Oportunidades de melhoria
-- Recomendações estratégicas
-
-Formato: Lista de insights curtos e objetivos.
-
 Insights:"""
 
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.4,
-                        "top_p": 0.9,
-                        "max_tokens": 300
-                    }
-                },
-                timeout=25
+            insights_text = self._generate(
+                prompt,
+                self.INSIGHTS_OPTIONS,
+                timeout=10,
+                task="insights"
             )
             
-            if response.status_code == 200:
-                result = response.json()
-                insights_text = result.get("response", "").strip()
-                
+            if insights_text is not None:
                 # Processa resposta em lista
                 insights = []
                 for line in insights_text.split('\n'):
@@ -198,61 +519,70 @@ Insights:"""
         return []
     
     def classify_query_intent(self, query: str) -> Dict[str, Any]:
-        """Classifica intenção da consulta usando Llama"""
+        """Classifica intenção da consulta (palavras-chave; Llama só se ambígua)"""
+        
+        # Caminho rápido: uma categoria com mais palavras-chave que as demais
+        keyword_match = self._keyword_classification(query)
+        if keyword_match:
+            return keyword_match
         
         if not self.available:
             return self._basic_classification(query)
         
-        prompt = f"""Analise esta consulta sobre dados de marketing imobiliário e classifique:
-
-Consulta: "{query}"
-
-Classifique em uma das categorias:
-- QUANTITATIVO: Perguntas sobre números, totais, contagens
-- PERFORMANCE: Análise de desempenho, rankings, comparações
-- TEMPORAL: Consultas sobre períodos, datas, tendências
-- ORIGEM: Análise de canais, fontes, campanhas
-- SITUACAO: Status de leads, funil de vendas
-- RESPONSAVEL: Performance de equipe, SDRs, corretores
-- GERAL: Consultas gerais ou explorações
-
-Responda APENAS a categoria, sem explicações.
+        classification = self._llm_classification(query)
+        if classification:
+            return {
+                "category": classification,
+                "confidence": 0.8,
+                "source": "llama"
+            }
+        
+        # Fallback para classificação básica
+        return self._basic_classification(query)
+    
+    def _llm_classification(self, query: str) -> Optional[str]:
+        """Categoria atribuída pelo modelo de classificação, ou None se inválida/erro"""
+        
+        prompt = CLASSIFY_PROMPT_PREFIX + f"""Consulta: "{query}"
 
 Categoria:"""
 
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,  # Muito conservador para classificação
-                        "max_tokens": 20
-                    }
-                },
-                timeout=10
+            # Classificação é praticamente determinística: chave pela consulta normalizada
+            classification = self._generate(
+                prompt,
+                self.CLASSIFY_OPTIONS,
+                timeout=10,
+                cache_key="classify:" + query.lower().strip(),
+                task="classify"
             )
             
-            if response.status_code == 200:
-                result = response.json()
-                classification = result.get("response", "").strip().upper()
-                
-                valid_categories = ["QUANTITATIVO", "PERFORMANCE", "TEMPORAL", "ORIGEM", "SITUACAO", "RESPONSAVEL", "GERAL"]
-                
-                if classification in valid_categories:
-                    return {
-                        "category": classification,
-                        "confidence": 0.8,
-                        "source": "llama"
-                    }
+            if classification is not None:
+                classification = classification.upper()
+                if classification in VALID_CATEGORIES:
+                    return classification
                     
         except Exception as e:
             print(f"[OLLAMA] Erro na classificação: {str(e)}")
         
-        # Fallback para classificação básica
-        return self._basic_classification(query)
+        return None
+    
+    def _keyword_classification(self, query: str) -> Optional[Dict[str, Any]]:
+        """Classificação por palavras-chave; None se nenhuma ou empate entre categorias"""
+        
+        scores = {
+            category: len(pattern.findall(query))
+            for category, pattern in CATEGORY_PATTERNS.items()
+        }
+        best = max(scores.values())
+        if best == 0:
+            return None
+        
+        winners = [category for category, score in scores.items() if score == best]
+        if len(winners) > 1:
+            return None
+        
+        return {"category": winners[0], "confidence": 0.75, "source": "keywords"}
     
     def _basic_classification(self, query: str) -> Dict[str, Any]:
         """Classificação básica sem IA"""
@@ -280,21 +610,9 @@ Categoria:"""
         }
         
         if self.available:
-            try:
-                # Testa modelo específico
-                response = requests.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": "Test",
-                        "stream": False,
-                        "options": {"max_tokens": 5}
-                    },
-                    timeout=5
-                )
-                status["model_ready"] = response.status_code == 200
-            except:
-                status["model_ready"] = False
+            # Verifica se o modelo está instalado pelos metadados - sem rodar inferência
+            models = self._fetch_models() or []
+            status["model_ready"] = self.model in models or f"{self.model}:latest" in models
         
         return status
 
@@ -1,49 +1,42 @@
 """
 Dashboard BI - Interface executiva para análise de dados CVDW
 """
+import os
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from config import Config
 from cvdw.connector import create_connector
 from cvdw.analyzer import create_analyzer
 
-# Configuração da página
-st.set_page_config(
-    page_title="Dashboard BI - CVDW",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'dashboard.css')
 
-# CSS para dashboard
-st.markdown("""
-<style>
-    .metric-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 8px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        border-left: 4px solid #2196F3;
-    }
-    .status-badge {
-        padding: 0.3rem 0.8rem;
-        border-radius: 20px;
-        font-size: 0.9rem;
-        font-weight: bold;
-    }
-    .status-online {
-        background: #d4edda;
-        color: #155724;
-    }
-    .status-offline {
-        background: #f8d7da;
-        color: #721c24;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css() -> str:
+    """Bloco <style> do dashboard, montado a partir de assets/dashboard.css"""
+    
+    with open(CSS_PATH, encoding='utf-8') as css_file:
+        return f"<style>\n{css_file.read()}</style>"
+
+def configure_page():
+    """Configuração da página e CSS (só quando executado pelo Streamlit)"""
+
+    # Configuração da página
+    st.set_page_config(
+        page_title="Dashboard BI - CVDW",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # CSS para dashboard (arquivo lido uma vez por processo)
+    st.markdown(load_css(), unsafe_allow_html=True)
+
+@st.cache_resource
+def get_connector():
+    """Conector CVDW único do processo: sessão HTTP e pool de conexões sobrevivem aos reruns"""
+    
+    return create_connector()
 
 def init_connector():
     """Inicializa conector CVDW"""
@@ -57,7 +50,7 @@ def init_connector():
                     st.error(f"• {error}")
                 return False
             
-            st.session_state.connector = create_connector()
+            st.session_state.connector = get_connector()
             return True
             
         except Exception as e:
@@ -75,15 +68,27 @@ def load_data(limit: int = 500):
     
     try:
         with st.spinner(f"Carregando {limit} leads..."):
-            # Testa conexão primeiro
-            test_result = st.session_state.connector.test_connection()
+            connector = st.session_state.connector
+            daily_cache = connector.daily_cache if connector.cache_enabled else None
+            
+            # Com a coleta de hoje no cache diário a busca é só leitura local: roda em
+            # paralelo ao teste. Sem ela, get_leads pode disparar a coleta completa ou
+            # consultar a API, então só busca depois de um teste bem-sucedido.
+            if daily_cache and daily_cache.has_complete_data_today():
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    leads_future = executor.submit(connector.get_leads, limit=limit)
+                    test_result = connector.test_connection()
+                    leads_result = leads_future.result()
+            else:
+                test_result = connector.test_connection()
+                leads_result = None
             
             if test_result["status"] != "success":
                 st.error(f"Erro na conexão: {test_result['message']}")
                 return None
             
-            # Busca dados
-            leads_result = st.session_state.connector.get_leads(limit=limit)
+            if leads_result is None:
+                leads_result = connector.get_leads(limit=limit)
             
             if leads_result["status"] == "success":
                 return leads_result
@@ -95,12 +100,31 @@ def load_data(limit: int = 500):
         st.error(f"Erro inesperado: {str(e)}")
         return None
 
-def create_charts(leads_data):
-    """Cria visualizações dos dados"""
+# Colunas de texto com poucos valores distintos: viram category (menos memória, contagens mais rápidas)
+CATEGORY_COLUMNS = ['situacao', 'origem_nome', 'origem', 'corretor', 'responsavel', 'gestor', 'vendedor']
+
+def prepare_dataframe(leads) -> "pd.DataFrame":
+    """Monta o DataFrame dos leads com tipos compactos e data_cad já convertida"""
+    
+    import pandas as pd
     
-    leads = leads_data["leads"]
     df = pd.DataFrame(leads)
     
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    
+    if 'data_cad' in df.columns:
+        # Formato explícito: sem inferência por linha nem fallback para o dateutil
+        df['data_cad'] = pd.to_datetime(df['data_cad'], format='ISO8601', errors='coerce', cache=True)
+    
+    return df
+
+def create_charts(df: "pd.DataFrame"):
+    """Cria visualizações dos dados"""
+    
+    import plotly.express as px
+    
     # Preparação dos dados
     charts = {}
     
@@ -122,7 +146,13 @@ def create_charts(leads_data):
     # 2. Leads por origem
     origem_col = 'origem_nome' if 'origem_nome' in df.columns else 'origem'
     if origem_col in df.columns:
-        origens = df[origem_col].value_counts().head(10)
+        origens = df[origem_col].value_counts()
+        outros = origens.iloc[10:].sum()
+        origens = origens.head(10)
+        if outros > 0:
+            # Agrupa a cauda em uma fatia só (menos elementos para o navegador renderizar)
+            origens = origens.copy()
+            origens['Outros'] = origens.get('Outros', 0) + outros
         
         fig_origem = px.pie(
             values=origens.values,
@@ -135,17 +165,17 @@ def create_charts(leads_data):
     # 3. Timeline de cadastros (se houver data)
     if 'data_cad' in df.columns:
         try:
-            df['data_cad'] = pd.to_datetime(df['data_cad'])
-            df['data_apenas'] = df['data_cad'].dt.date
-            
-            timeline = df.groupby('data_apenas').size().sort_index()
+            # data_cad já convertida em prepare_dataframe; agrupa por dia sem sair de datetime64
+            # (série limitada a 30 pontos diários: o payload do gráfico não cresce com a base)
+            timeline = df['data_cad'].dt.normalize().value_counts().sort_index()
             timeline_recent = timeline.tail(30)  # Últimos 30 dias com dados
             
             fig_timeline = px.line(
                 x=timeline_recent.index,
                 y=timeline_recent.values,
                 title="Leads Cadastrados - Últimos 30 Períodos",
-                labels={'x': 'Data', 'y': 'Leads Cadastrados'}
+                labels={'x': 'Data', 'y': 'Leads Cadastrados'},
+                render_mode='webgl'
             )
             fig_timeline.update_layout(height=400)
             charts['timeline'] = fig_timeline
@@ -177,8 +207,41 @@ def create_charts(leads_data):
             fig_responsavel.update_layout(height=400)
             charts['responsavel'] = fig_responsavel
     
+    # uirevision fixo: reruns do Streamlit preservam zoom/estado do layout
+    for name, fig in charts.items():
+        fig.update_layout(uirevision=name)
+    
     return charts
 
+def _data_fingerprint(leads_data) -> tuple:
+    """Identifica o lote de dados carregado (chave dos caches de rerun)"""
+    
+    return (
+        leads_data.get('timestamp'),
+        leads_data.get('total_coletados'),
+        leads_data.get('metadata', {}).get('total_disponivel')
+    )
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _build_charts(fingerprint: tuple, _df: "pd.DataFrame") -> dict:
+    """Gráficos do lote serializados em JSON do Plotly (menos memória no cache)"""
+    
+    return {name: fig.to_json() for name, fig in create_charts(_df).items()}
+
+def get_charts(leads_data, df: "pd.DataFrame") -> dict:
+    """Gráficos do lote carregado, reconstruídos só quando os dados mudam"""
+    
+    import plotly.io as pio
+    
+    charts_json = _build_charts(_data_fingerprint(leads_data), df)
+    return {name: pio.from_json(fig_json) for name, fig_json in charts_json.items()}
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _analyze_comprehensive(fingerprint: tuple, _leads) -> dict:
+    """Análise abrangente do lote, recalculada só quando os dados mudam"""
+    
+    return create_analyzer().analyze_comprehensive(_leads)
+
 def main():
     """Interface principal do dashboard"""
     
@@ -210,6 +273,8 @@ def main():
             leads_data = load_data(limit=data_limit)
             if leads_data:
                 st.session_state.dashboard_data = leads_data
+                # DataFrame montado uma vez por carga, reaproveitado em métricas, gráficos e tabela
+                st.session_state.dashboard_df = prepare_dataframe(leads_data["leads"])
                 st.session_state.data_loaded = True
                 st.success(f"✅ {leads_data['total_coletados']} leads carregados")
                 st.rerun()
@@ -243,22 +308,29 @@ def main():
         total_analisados = leads_data["total_coletados"]
         total_base = leads_data["metadata"]["total_disponivel"]
         
-        # Calcula métricas
-        vendas = sum(1 for lead in leads if lead.get('situacao') == 'VENDA REALIZADA')
-        reservas = sum(1 for lead in leads if lead.get('situacao') == 'RESERVA')
-        atendimento = sum(1 for lead in leads if 'ATENDIMENTO' in lead.get('situacao', ''))
+        df = st.session_state.get('dashboard_df')
+        if df is None:
+            df = prepare_dataframe(leads)
+            st.session_state.dashboard_df = df
+        
+        # Calcula métricas: uma contagem por situação, consultada para cada métrica
+        if 'situacao' in df.columns:
+            sit_counts = df['situacao'].value_counts()
+            sit_counts = sit_counts[sit_counts > 0]  # category lista também situações sem leads
+            vendas = int(sit_counts.get('VENDA REALIZADA', 0))
+            reservas = int(sit_counts.get('RESERVA', 0))
+            atendimento = int(sit_counts[sit_counts.index.astype(str).str.contains('ATENDIMENTO', regex=False)].sum())
+        else:
+            vendas = reservas = atendimento = 0
         
         with col1:
             st.metric("📊 Analisados", f"{total_analisados:,}")
         
-        with col2:
-            st.metric("💰 Vendas", vendas, delta=f"{vendas/total_analisados*100:.1f}%")
-        
-        with col3:
-            st.metric("📝 Reservas", reservas, delta=f"{reservas/total_analisados*100:.1f}%")
-        
-        with col4:
-            st.metric("🎯 Em Atendimento", atendimento, delta=f"{atendimento/total_analisados*100:.1f}%")
+        # Cards de situação montados a partir de uma lista de especificações
+        metric_specs = [("💰 Vendas", vendas), ("📝 Reservas", reservas), ("🎯 Em Atendimento", atendimento)]
+        divisor = total_analisados or 1
+        for column, (label, value) in zip((col2, col3, col4), metric_specs):
+            column.metric(label, value, delta=f"{value / divisor * 100:.1f}%")
         
         st.divider()
         
@@ -267,8 +339,7 @@ def main():
         st.subheader("🔍 Análise Empresarial Avançada")
         
         with st.spinner("Gerando insights empresariais..."):
-            analyzer = create_analyzer()
-            analysis = analyzer.analyze_comprehensive(leads)
+            analysis = _analyze_comprehensive(_data_fingerprint(leads_data), leads)
         
         # Insights de negócio
         col1, col2 = st.columns(2)
@@ -291,6 +362,9 @@ def main():
             perf_data = list(analysis["performance"].values())[0]  # Pega primeiro campo válido
             
             if "top_performers" in perf_data:
+                import pandas as pd
+                import plotly.express as px
+                
                 perf_df = pd.DataFrame(perf_data["top_performers"])
                 
                 fig_perf = px.bar(
@@ -324,7 +398,7 @@ def main():
         st.divider()
         
         # Gráficos
-        charts = create_charts(leads_data)
+        charts = get_charts(leads_data, df)
         
         # Layout dos gráficos
         if charts:
@@ -355,8 +429,6 @@ def main():
         st.subheader("📋 Dados Detalhados")
         
         if leads:
-            df = pd.DataFrame(leads)
-            
             # Seleciona colunas relevantes para exibição
             display_cols = []
             available_cols = df.columns.tolist()
@@ -418,4 +490,5 @@ def main():
     st.caption(f"💡 Dashboard atualizado em {timestamp} | Sistema: Agente BI v5.0 | API: CVDW BP Incorporadora")
 
 if __name__ == "__main__":
+    configure_page()
     main()
\ No newline at end of file
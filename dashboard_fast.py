@@ -3,62 +3,188 @@ BP DASHBOARD - Fast Version
 Dashboard otimizado com leads mais recentes
 """
 import streamlit as st
-import requests
-import os
+import threading
 import pandas as pd
 import plotly.express as px
-from dotenv import load_dotenv
+import plotly.graph_objects as go
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-load_dotenv()
+from config import Config
+from cvdw.http_utils import create_session, response_json, retry_after_seconds
+
+try:
+    from diskcache import Cache
+except ImportError:
+    Cache = None  # diskcache opcional: sem ele só há o cache em memória do Streamlit
 
 st.set_page_config(page_title="BP Dashboard Fast", layout="wide")
 
 st.title("🚀 BP DASHBOARD - Fast & Recent")
 st.write("Dashboard otimizado mostrando leads mais RECENTES")
 
-# Credenciais
-email = os.getenv('CVCRM_EMAIL')
-token = os.getenv('CVCRM_TOKEN')
+# Credenciais: lidas do .env uma vez por processo (config é importado uma vez; o script roda a cada rerun)
+email = Config.CVCRM_EMAIL
+token = Config.CVCRM_TOKEN
 
 if not email or not token:
     st.error("❌ Credenciais não encontradas no .env")
     st.stop()
 
+CVDW_LEADS_URL = "https://bpincorporadora.cvcrm.com.br/api/v1/cvdw/leads"
+PAGES_TO_FETCH = 3  # Páginas buscadas por atualização
+MAX_WORKERS = 6
+PAGE_CACHE_DIR = '.cvdw_cache'
+PAGE_CACHE_TTL = 3600  # 1 hora
+PAGE_CACHE_TAG = 'leads_pages'
+PLOTLY_CONFIG = {'responsive': True, 'displaylogo': False}
+CATEGORY_COLUMNS = ['situacao', 'origem_nome']
+
+
+@st.cache_resource
+def get_session():
+    """Sessão HTTP compartilhada entre reruns (keep-alive + retry)"""
+    return create_session({"email": email, "token": token}, pool_maxsize=8)
+
+
+@st.cache_resource
+def get_inflight_requests():
+    """Requisições em andamento compartilhadas entre reruns e sessões: (dict chave -> Future, lock)"""
+    return {}, threading.Lock()
+
+
+def get_page(session, page, limit):
+    """GET de uma página da API, uma requisição por (email, página, limite, dia)
+
+    Reruns sobrepostos que pedem a mesma página aguardam a requisição já em andamento
+    em vez de disparar outra (duplicatas só aceleram o 429).
+    """
+
+    key = (email, page, limit, datetime.now().strftime('%Y-%m-%d'))
+    inflight, lock = get_inflight_requests()
+    with lock:
+        future = inflight.get(key)
+        owner = future is None
+        if owner:
+            future = inflight[key] = Future()
+
+    if not owner:
+        return future.result()
+
+    try:
+        response = session.get(CVDW_LEADS_URL, params={"registros_por_pagina": limit, "pagina": page}, timeout=15)
+        future.set_result(response)
+        return response
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with lock:
+            inflight.pop(key, None)
+
+
+@st.cache_resource
+def get_page_cache():
+    """Cache em disco das páginas, compartilhado entre reinícios e usuários (None sem diskcache)"""
+    return Cache(PAGE_CACHE_DIR) if Cache is not None else None
+
+
+def page_cache_key(page, limit):
+    """Chave da página no cache em disco (válida só no dia)"""
+    return ('leads_page', page, limit, datetime.now().strftime('%Y-%m-%d'))
+
+
+def sync_page_cache(cache, revision):
+    """Descarta as páginas em disco quando o total de registros da base muda"""
+
+    if cache is None:
+        return
+    if cache.get('leads_rev') != revision:
+        cache.evict(PAGE_CACHE_TAG)
+        cache.set('leads_rev', revision)
+
+
+def fetch_next_pages(session, limit, total_pages):
+    """Busca as páginas 2..PAGES_TO_FETCH em paralelo, mantendo a ordem das páginas
+
+    Páginas já presentes no cache em disco não são requisitadas de novo.
+    Em caso de 429 as requisições pendentes são canceladas e ficam só as páginas já obtidas.
+    Retorna (leads, segundos de Retry-After ou None).
+    """
+
+    last_page = min(total_pages, PAGES_TO_FETCH)
+    if last_page < 2:
+        return [], None
+
+    cache = get_page_cache()
+    pages = {}
+    missing = []
+    for page in range(2, last_page + 1):
+        cached = cache.get(page_cache_key(page, limit)) if cache is not None else None
+        if cached is not None:
+            pages[page] = cached
+        else:
+            missing.append(page)
+
+    retry_after = None
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(get_page, session, page, limit): page
+            for page in missing
+        }
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception:
+                continue
+
+            if response.status_code == 429:
+                retry_after = retry_after_seconds(response) or 60.0
+                for pending in futures:
+                    pending.cancel()
+                break
+            if response.status_code == 200:
+                page = futures[future]
+                pages[page] = response_json(response).get('dados', [])
+                if cache is not None:
+                    cache.set(page_cache_key(page, limit), pages[page],
+                              expire=PAGE_CACHE_TTL, tag=PAGE_CACHE_TAG)
+
+    leads = []
+    for page in sorted(pages):
+        leads.extend(pages[page])
+    return leads, retry_after
+
+
+FETCH_TTL = 300  # Cache por 5 minutos
+
+
 # Cache da função de busca
-@st.cache_data(ttl=300)  # Cache por 5 minutos
+@st.cache_data(ttl=FETCH_TTL)
 def fetch_recent_leads(limit=500, focus_previous_month=True):
     """Busca leads filtrados por mês anterior fechado como padrão"""
 
-    url = "https://bpincorporadora.cvcrm.com.br/api/v1/cvdw/leads"
-    headers = {"email": email, "token": token}
+    session = get_session()
 
-    # Busca primeira página para ver total
-    params = {"registros_por_pagina": limit, "pagina": 1}
-    
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=15)
+        # Busca primeira página para ver total
+        response = get_page(session, 1, limit)
         
         if response.status_code == 200:
-            data = response.json()
-            leads = data.get('dados', [])
+            data = response_json(response)
+            # Página 1 sempre vem da API: o total de registros serve de revisão do cache em disco
+            sync_page_cache(get_page_cache(), data.get('total_de_registros', 0))
+            more_leads, retry_after = fetch_next_pages(session, limit, data.get('total_de_paginas', 1))
+            leads = data.get('dados', []) + more_leads
             
             # Define período baseado no foco
             current_date = pd.Timestamp.now()
 
             if focus_previous_month:
-                # Mês anterior fechado (mais preciso para análise)
-                if current_date.month == 1:
-                    # Janeiro -> pega dezembro do ano anterior
-                    start_date = pd.Timestamp(current_date.year - 1, 12, 1)
-                    end_date = pd.Timestamp(current_date.year, 1, 1) - pd.Timedelta(days=1)
-                else:
-                    # Outros meses -> pega mês anterior
-                    start_date = pd.Timestamp(current_date.year, current_date.month - 1, 1)
-                    if current_date.month == 12:
-                        end_date = pd.Timestamp(current_date.year + 1, 1, 1) - pd.Timedelta(days=1)
-                    else:
-                        end_date = pd.Timestamp(current_date.year, current_date.month, 1) - pd.Timedelta(days=1)
+                # Mês anterior fechado (mais preciso para análise); vale também na virada do ano
+                month_start = current_date.normalize().replace(day=1)
+                end_date = month_start - pd.Timedelta(days=1)
+                start_date = end_date.replace(day=1)
                 period_label = f"{start_date.strftime('%B %Y')} (Mês Anterior Fechado)"
             else:
                 # Últimos 30 dias
@@ -67,37 +193,34 @@ def fetch_recent_leads(limit=500, focus_previous_month=True):
                 end_date = current_date
                 period_label = "Últimos 30 dias"
 
-            leads_filtered = []
-
-            for lead in leads:
-                try:
-                    # Limpa e converte data
-                    data_str = lead.get('data_cad', '')
-                    if data_str:
-                        # Remove possível timestamp
-                        if ' ' in data_str:
-                            data_str = data_str.split(' ')[0]
-                        lead['data_cad_dt'] = pd.to_datetime(data_str, errors='coerce')
-
-                        # Filtra por período definido
-                        if pd.notna(lead['data_cad_dt']) and start_date <= lead['data_cad_dt'] <= end_date:
-                            leads_filtered.append(lead)
-                    else:
-                        lead['data_cad_dt'] = pd.NaT
-                        leads_filtered.append(lead)  # Inclui leads sem data por segurança
-                except:
-                    lead['data_cad_dt'] = pd.NaT
-                    leads_filtered.append(lead)
-
-            # Ordena por data mais recente
-            leads_sorted = sorted(leads_filtered, key=lambda x: x.get('data_cad_dt', pd.Timestamp.min), reverse=True)
-            
+            # DataFrame montado uma vez; métricas, lista e gráficos leem colunas dele
+            df = pd.DataFrame(leads)
+            if 'data_cad' not in df:
+                df['data_cad'] = ''
+
+            # Filtro vetorizado: uma conversão de datas para a coluna inteira
+            datas_str = df['data_cad'].fillna('').astype(str).str.split(' ').str[0]  # Remove possível timestamp
+            df['data_cad_dt'] = pd.to_datetime(datas_str, errors='coerce', format='%Y-%m-%d', cache=True)
+
+            sem_data = datas_str == ''  # Inclui leads sem data por segurança
+            mask = df['data_cad_dt'].between(start_date, end_date) | sem_data
+
+            # Ordena por data mais recente (sem data ao final)
+            df = df.loc[mask].sort_values('data_cad_dt', ascending=False, na_position='last', kind='stable')
+
+            # Colunas de baixa cardinalidade como category: menos memória e contagens mais rápidas
+            for column in CATEGORY_COLUMNS:
+                if column in df:
+                    df[column] = df[column].fillna('N/A').astype('category')
+
             return {
                 "status": "success",
-                "leads": leads_sorted,
+                "df": df.reset_index(drop=True),
+                "metrics": compute_metrics(df),  # Calculadas uma vez por busca (ficam no cache)
                 "total": data.get('total_de_registros', 0),
                 "total_pages": data.get('total_de_paginas', 0),
-                "period_label": period_label
+                "period_label": period_label,
+                "retry_after": retry_after
             }
         elif response.status_code == 429:
             return {"status": "rate_limit", "message": "Rate limit ativo"}
@@ -107,6 +230,63 @@ def fetch_recent_leads(limit=500, focus_previous_month=True):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def count_values(df, column):
+    """Contagem por valor da coluna, com índice em texto ('N/A' se a coluna não existir)"""
+
+    if column not in df:
+        return pd.Series({'N/A': len(df)})
+    counts = df[column].value_counts()
+    counts.index = counts.index.astype(str)
+    return counts
+
+
+def fold_small_categories(counts, top_n=10, visibility_threshold=0.0):
+    """Mantém as top_n categorias acima do limiar (% do total) e agrupa o resto em 'Outros'"""
+
+    total = counts.sum()
+    top = counts.head(top_n)
+    if total and visibility_threshold > 0:
+        top = top[top / total * 100 >= visibility_threshold]
+
+    outros = total - top.sum()
+    if outros > 0:
+        top = top.copy()
+        top['Outros'] = top.get('Outros', 0) + outros
+    return top
+
+
+SITUACAO_BUCKETS = {'vendas': 'VENDA', 'reservas': 'RESERVA'}
+
+
+def situacao_bucket_totals(sit_counts):
+    """Totais por balde a partir da contagem por situação (cada situação distinta é testada uma vez)"""
+
+    upper = sit_counts.index.astype(str).str.upper()
+    return {
+        bucket: int(sit_counts[upper.str.contains(term, regex=False)].sum())
+        for bucket, term in SITUACAO_BUCKETS.items()
+    }
+
+
+EMPTY_METRICS = {"leads": 0, "sit_counts": pd.Series(dtype='int64'), "vendas": 0, "reservas": 0}
+
+
+def compute_metrics(df):
+    """Métricas do período: contagem por situação e totais por balde (atalho para período vazio)"""
+
+    if df.empty:
+        return dict(EMPTY_METRICS)
+
+    sit_counts = count_values(df, 'situacao')
+    return {"leads": len(df), "sit_counts": sit_counts, **situacao_bucket_totals(sit_counts)}
+
+
+# Sidebar: controle de fatias visíveis nos gráficos de pizza
+visibility_threshold = st.sidebar.slider(
+    "Fatia mínima no gráfico de origem (%)", 0.0, 10.0, 1.0, 0.5,
+    help="Origens abaixo deste percentual (ou fora do top 10) são agrupadas em 'Outros'"
+)
+
 # Interface principal
 col1, col2 = st.columns([2, 1])
 
@@ -119,15 +299,31 @@ with col1:
 
     # Busca dados do mês anterior fechado
     period_text = "mês anterior fechado" if focus_previous else "últimos 30 dias"
-    with st.spinner(f"Buscando leads do {period_text}..."):
-        result = fetch_recent_leads(500, focus_previous_month=focus_previous)
+    result = st.session_state.get('last_result')
+    result_age = (datetime.now() - st.session_state.get('last_fetch_at', datetime.min)).total_seconds()
+    if result is None or st.session_state.get('last_period') != focus_previous or result_age > FETCH_TTL:
+        # Só busca quando o período muda ou o resultado expira; outros widgets reaproveitam
+        with st.spinner(f"Buscando leads do {period_text}..."):
+            result = fetch_recent_leads(500, focus_previous_month=focus_previous)
+        if result["status"] == "success":
+            st.session_state['last_period'] = focus_previous
+            st.session_state['last_result'] = result
+            st.session_state['last_fetch_at'] = datetime.now()
+        else:
+            st.session_state.pop('last_result', None)
     
     if result["status"] == "success":
-        leads = result["leads"]
+        df = result["df"]
         total = result["total"]
+
+        # Uma contagem por situação alimenta as métricas e o gráfico
+        metrics = result["metrics"]
+        sit_counts = metrics["sit_counts"]
         
         period_display = result.get('period_label', period_text)
-        st.success(f"✅ {len(leads)} leads de {period_display} | Base total: {total:,}")
+        st.success(f"✅ {len(df)} leads de {period_display} | Base total: {total:,}")
+        if result.get("retry_after"):
+            st.info(f"ℹ️ Rate limit durante a busca: dados parciais (tente novamente em ~{result['retry_after']:.0f}s)")
         
         # Métricas principais
         col_a, col_b, col_c, col_d = st.columns(4)
@@ -136,62 +332,59 @@ with col1:
             st.metric("Total Base", f"{total:,}")
         
         with col_b:
-            leads_periodo = len(leads)  # Já filtrados por período
+            leads_periodo = metrics["leads"]  # Já filtrados por período
             period_short = "Mês Anterior" if focus_previous else "30 Dias"
             st.metric(f"Leads {period_short}", leads_periodo)
         
         with col_c:
-            vendas = len([l for l in leads if 'VENDA' in l.get('situacao', '').upper()])
-            st.metric(f"Vendas {period_short}", vendas)
+            st.metric(f"Vendas {period_short}", metrics['vendas'])
 
         with col_d:
-            reservas = len([l for l in leads if 'RESERVA' in l.get('situacao', '').upper()])
-            st.metric(f"Reservas {period_short}", reservas)
+            st.metric(f"Reservas {period_short}", metrics['reservas'])
         
         # Lista dos leads mais recentes do período
         st.subheader(f"🔥 Leads Mais Recentes - {period_display}")
         
-        for i, lead in enumerate(leads[:10], 1):
-            nome = lead.get('nome', 'N/A')
-            situacao = lead.get('situacao', 'N/A')
-            origem = lead.get('origem_nome', 'N/A')
-            data_cad = lead.get('data_cad', 'N/A')
-            
-            # Emoji baseado na situação
-            emoji = "✅" if 'VENDA' in situacao.upper() else "🔄" if 'FOLLOW' in situacao.upper() else "📝"
-            
-            st.write(f"{emoji} **{i}.** {nome} | {situacao} | {origem} | {data_cad}")
+        recentes = df.head(10).reindex(columns=['nome', 'situacao', 'origem_nome', 'data_cad']).astype(object).fillna('N/A')
+
+        # Marcador baseado na situação (VENDA tem prioridade sobre FOLLOW)
+        situacao_upper = recentes['situacao'].astype(str).str.upper()
+        marcadores = pd.Series("-", index=recentes.index)
+        marcadores[situacao_upper.str.contains('FOLLOW', regex=False)] = "FOLLOW"
+        marcadores[situacao_upper.str.contains('VENDA', regex=False)] = "VENDA"
+        recentes.insert(0, '', marcadores)
+
+        # Uma tabela só (uma mensagem para o frontend em vez de uma por lead)
+        st.dataframe(
+            recentes.rename(columns={'nome': 'Nome', 'situacao': 'Situação',
+                                     'origem_nome': 'Origem', 'data_cad': 'Cadastro'}),
+            hide_index=True, use_container_width=True
+        )
         
         # Gráfico por situação (período selecionado)
-        if leads:
-            situacoes = {}
-            for lead in leads:
-                sit = lead.get('situacao', 'N/A')
-                situacoes[sit] = situacoes.get(sit, 0) + 1
-
-            if situacoes:
+        if not df.empty:
+            if not sit_counts.empty:
                 st.subheader(f"📈 Situações - {period_display}")
 
-                df_sit = pd.DataFrame(list(situacoes.items()), columns=['Situação', 'Quantidade'])
-                fig = px.bar(df_sit, x='Situação', y='Quantidade',
-                           color='Quantidade',
-                           title=f"Distribuição por Situação - {period_display}")
-                fig.update_layout(height=400, showlegend=False)
-                fig.update_xaxis(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
+                fig = go.Figure(go.Bar(
+                    x=sit_counts.index, y=sit_counts.values,
+                    marker=dict(color=sit_counts.values, colorscale='Plasma')
+                ))
+                # uirevision: reruns do Streamlit preservam zoom/estado do layout
+                fig.update_layout(title=f"Distribuição por Situação - {period_display}",
+                                  xaxis_title='Situação', yaxis_title='Quantidade',
+                                  height=400, showlegend=False, bargap=0.1, uirevision='sit_bar')
+                fig.update_xaxes(tickangle=45)
+                st.plotly_chart(fig, use_container_width=True, config=PLOTLY_CONFIG)
 
                 # Gráfico por origem também
                 st.subheader(f"📊 Origem dos Leads - {period_display}")
-                origens = {}
-                for lead in leads:
-                    origem = lead.get('origem_nome', 'N/A')
-                    origens[origem] = origens.get(origem, 0) + 1
-
-                df_origem = pd.DataFrame(list(origens.items()), columns=['Origem', 'Quantidade'])
+                origem_counts = fold_small_categories(count_values(df, 'origem_nome'), 10, visibility_threshold)
+                df_origem = pd.DataFrame({'Origem': origem_counts.index, 'Quantidade': origem_counts.values})
                 fig2 = px.pie(df_origem, values='Quantidade', names='Origem',
                             title=f"Distribuição por Origem - {period_display}")
-                fig2.update_layout(height=400)
-                st.plotly_chart(fig2, use_container_width=True)
+                fig2.update_layout(height=400, uirevision='origem_pie')
+                st.plotly_chart(fig2, use_container_width=True, config=PLOTLY_CONFIG)
     
     elif result["status"] == "rate_limit":
         st.warning("⚠️ **Rate Limit Ativo** (HTTP 429)")
@@ -199,6 +392,7 @@ with col1:
         
         if st.button("🔄 Tentar Novamente"):
             st.cache_data.clear()
+            st.session_state.pop('last_result', None)
             st.rerun()
     
     else:
@@ -210,6 +404,7 @@ with col2:
     # Botão para atualizar dados
     if st.button("🔄 Atualizar Dados"):
         st.cache_data.clear()
+        st.session_state.pop('last_result', None)
         st.rerun()
     
     # Informações
@@ -224,7 +419,7 @@ with col2:
     
     st.subheader("📈 Performance")
     st.metric("Cache TTL", "5 min")
-    st.metric("Limite Busca", "200 leads")
+    st.metric("Limite Busca", f"{PAGES_TO_FETCH} x 500 leads")
     st.metric("Ordenação", "Mais recentes")
     
     # Status
@@ -3,12 +3,10 @@ BP DASHBOARD - Simple
 Dashboard mínimo que funciona sempre
 """
 import streamlit as st
-import requests
-import os
-from dotenv import load_dotenv
 from datetime import datetime
 
-load_dotenv()
+from config import Config
+from cvdw.http_utils import create_session, response_json
 
 st.set_page_config(page_title="BP Dashboard Simple", layout="wide")
 
@@ -18,8 +16,9 @@ st.write("Dashboard super simples para testar a API")
 # Teste básico
 st.subheader("🔧 Teste de Credenciais")
 
-email = os.getenv('CVCRM_EMAIL')
-token = os.getenv('CVCRM_TOKEN')
+# Lidas do .env uma vez por processo (config é importado uma vez; o script roda a cada rerun)
+email = Config.CVCRM_EMAIL
+token = Config.CVCRM_TOKEN
 
 if email and token:
     st.success(f"✅ Email: {email[:10]}...")
@@ -28,19 +27,34 @@ else:
     st.error("❌ Credenciais não encontradas no .env")
     st.stop()
 
+@st.cache_resource
+def get_session(email, token):
+    """Sessão HTTP keep-alive compartilhada entre reruns"""
+    return create_session({"email": email, "token": token})
+
+@st.cache_data(ttl=60)  # Reruns dentro de 1 minuto reaproveitam o teste
+def test_api_connection(email, token):
+    """Requisição de teste à API CVDW (status HTTP, JSON decodificado e início do corpo)"""
+
+    url = "https://bpincorporadora.cvcrm.com.br/api/v1/cvdw/leads"
+    params = {"registros_por_pagina": 5}
+
+    response = get_session(email, token).get(url, params=params, timeout=10)
+    return {
+        "status_code": response.status_code,
+        "data": response_json(response) if response.status_code == 200 else None,
+        "text": response.text[:200]
+    }
+
 # Teste de conexão
 st.subheader("🌐 Teste de Conexão API")
 
 try:
     with st.spinner("Testando conexão..."):
-        url = "https://bpincorporadora.cvcrm.com.br/api/v1/cvdw/leads"
-        headers = {"email": email, "token": token}
-        params = {"registros_por_pagina": 5}
-        
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = test_api_connection(email, token)
         
-        if response.status_code == 200:
-            data = response.json()
+        if response["status_code"] == 200:
+            data = response["data"]
             st.success("✅ API Online e Funcionando!")
             
             col1, col2, col3 = st.columns(3)
@@ -57,7 +71,7 @@ try:
                 for i, lead in enumerate(data['dados'][:3]):
                     st.write(f"**{i+1}.** {lead.get('nome', 'N/A')} - {lead.get('data_cad', 'N/A')} - {lead.get('situacao', 'N/A')}")
                     
-        elif response.status_code == 429:
+        elif response["status_code"] == 429:
             st.warning("⚠️ **Rate Limit Ativo** (HTTP 429)")
             st.info("""
             **Status**: A API está online, mas temporariamente limitando requisições.
@@ -69,11 +83,12 @@ try:
             
             # Botão para recarregar
             if st.button("🔄 Tentar Novamente"):
+                test_api_connection.clear()
                 st.rerun()
                 
         else:
-            st.error(f"❌ Erro HTTP: {response.status_code}")
-            st.write("Status da resposta:", response.text[:200] if hasattr(response, 'text') else "N/A")
+            st.error(f"❌ Erro HTTP: {response['status_code']}")
+            st.write("Status da resposta:", response["text"] or "N/A")
             
 except Exception as e:
     st.error(f"❌ Erro de Conexão: {str(e)}")
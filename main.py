@@ -24,23 +24,6 @@ st.markdown("""
         text-align: center;
         margin-bottom: 1.5rem;
     }
-    .chat-message {
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 0.8rem 0;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        color: #000000 !important;
-    }
-    .user-message {
-        background: linear-gradient(135deg, #E3F2FD 0%, #BBDEFB 100%);
-        border-left: 4px solid #2196F3;
-        color: #000000 !important;
-    }
-    .agent-message {
-        background: linear-gradient(135deg, #F1F8E9 0%, #DCEDC8 100%);
-        border-left: 4px solid #4CAF50;
-        color: #000000 !important;
-    }
     .stChatMessage {
         color: #000000 !important;
     }
@@ -71,6 +54,25 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Exemplos de consultas da sidebar com chaves de widget estáveis entre execuções
+EXAMPLE_QUERIES = tuple((query, f"example_{i}") for i, query in enumerate([
+    "Quantos leads, reservas e vendas tivemos no mês anterior?",
+    "Performance do mês anterior por origem",
+    "Qual o SDR com maior quantidade de leads no mês anterior?",
+    "Taxa de conversão do mês anterior fechado",
+    "Análise do mês anterior de vendas e reservas"
+]))
+
+@st.cache_data
+def config_validation() -> dict:
+    """Validação das configurações (fixas por processo: calculada uma vez)"""
+    return Config.validate()
+
+@st.cache_data
+def config_summary() -> dict:
+    """Resumo das configurações exibido na sidebar (calculado uma vez)"""
+    return Config.get_summary()
+
 def init_agent():
     """Inicializa agente CVDW"""
     
@@ -78,7 +80,7 @@ def init_agent():
         with st.spinner('Inicializando Agente CVDW...'):
             try:
                 # Valida configurações
-                validation = Config.validate()
+                validation = config_validation()
                 if not validation["valid"]:
                     st.error("Erro nas configurações:")
                     for error in validation["errors"]:
@@ -103,22 +105,17 @@ def init_agent():
                 st.session_state.system_online = False
 
 def display_message(role: str, content: str):
-    """Exibe mensagem formatada"""
+    """Exibe mensagem no componente nativo de chat (sem montar HTML por mensagem)"""
+    
+    # Quebras de linha preservadas; '$' escapado para não virar fórmula (ex: R$)
+    text = content.replace('$', '\\$').replace('\n', '  \n')
     
     if role == "user":
-        st.markdown(f"""
-        <div class="chat-message user-message">
-            <strong>👤 Você:</strong><br>
-            {content}
-        </div>
-        """, unsafe_allow_html=True)
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(text)
     else:
-        st.markdown(f"""
-        <div class="chat-message agent-message">
-            <strong>🤖 Agente IA:</strong><br>
-            {content.replace(chr(10), '<br>')}
-        </div>
-        """, unsafe_allow_html=True)
+        with st.chat_message("assistant", avatar="🤖"):
+            st.markdown(text)
 
 def main():
     """Interface principal"""
@@ -141,6 +138,8 @@ def main():
         else:
             st.markdown('<span class="status-offline">🔴 Sistema Offline</span>', unsafe_allow_html=True)
             if st.button("🔄 Reconectar"):
+                config_validation.clear()
+                config_summary.clear()
                 if 'agent' in st.session_state:
                     with st.spinner("Testando reconexão..."):
                         result = st.session_state.agent.reconnect()
@@ -158,16 +157,8 @@ def main():
         # Exemplos de consultas
         st.subheader("💬 Exemplos")
         
-        example_queries = [
-            "Quantos leads, reservas e vendas tivemos no mês anterior?",
-            "Performance do mês anterior por origem",
-            "Qual o SDR com maior quantidade de leads no mês anterior?",
-            "Taxa de conversão do mês anterior fechado",
-            "Análise do mês anterior de vendas e reservas"
-        ]
-        
-        for query in example_queries:
-            if st.button(f"📝 {query}", key=f"example_{hash(query)}", use_container_width=True):
+        for query, key in EXAMPLE_QUERIES:
+            if st.button(f"📝 {query}", key=key, use_container_width=True):
                 st.session_state.user_input = query
                 st.rerun()
         
@@ -269,12 +260,12 @@ Vou começar mostrando os dados do mês anterior fechado (análise mais precisa)
         
         # Configurações
         with st.expander("🔧 Configurações"):
-            config_summary = Config.get_summary()
+            summary = config_summary()
             
-            st.write("**API Status:**", "✅ Habilitada" if config_summary["api_enabled"] else "❌ Desabilitada")
-            st.write("**Debug:**", "Sim" if config_summary["debug_mode"] else "Não")
-            st.write("**Cache:**", f"{config_summary['cache_timeout']}s")
-            st.write("**Máx. Leads:**", config_summary['max_leads'])
+            st.write("**API Status:**", "✅ Habilitada" if summary["api_enabled"] else "❌ Desabilitada")
+            st.write("**Debug:**", "Sim" if summary["debug_mode"] else "Não")
+            st.write("**Cache:**", f"{summary['cache_timeout']}s")
+            st.write("**Máx. Leads:**", summary['max_leads'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,17 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    json_loads = orjson.loads  # Faster parsing of the page payloads
+except ImportError:
+    from json import loads as json_loads
 import time
-import pandas as pd
-import ollama
-import json
 from dotenv import load_dotenv
 from datetime import date
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 
 # --- 1. SETUP: LOAD CREDENTIALS (GEMINI KEY IS NO LONGER NEEDED) ---
@@ -24,6 +30,44 @@ if not all([CV_SUBDOMAIN, CV_EMAIL, CV_TOKEN]):
 # The genai.configure line is removed. litellm requires no configuration for Ollama.
 
 
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the API (AIMD): the rate is halved on
+    every 429 and grows 10% after each window of consecutive successful pages.
+    """
+    def __init__(self, rate: float = 5.0, min_rate: float = 0.5, max_rate: float = 20.0,
+                 success_window: int = 10):
+        self.rate = rate  # Requests per second
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.success_window = success_window
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._successes = 0
+
+    def consume(self):
+        """Blocks until a token is available, then takes it."""
+        now = time.monotonic()
+        self._tokens = min(1.0, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens < 1.0:
+            time.sleep((1.0 - self._tokens) / self.rate)
+            self._updated_at = time.monotonic()
+            self._tokens = 1.0
+        self._tokens -= 1.0
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.success_window:
+            self._successes = 0
+            self.rate = min(self.rate * 1.1, self.max_rate)
+
+    def on_rate_limited(self):
+        self._successes = 0
+        self.rate = max(self.rate * 0.5, self.min_rate)
+        print(f"    [WARN] Lowering request rate to {self.rate:.2f} req/s.")
+
+
 # --- 2. THE API COMMUNICATION CLASS (REMAINS EXACTLY THE SAME) ---
 class CVCrmAPI:
     """
@@ -38,27 +82,49 @@ class CVCrmAPI:
             'email': email,
             'token': token
         }
+        self.session = self._create_session()
+        self.rate_limiter = AdaptiveRateLimiter()  # Paces page requests instead of a fixed sleep
         print("[OK] CVCrmAPI initialized and ready.")
 
+    def _create_session(self) -> requests.Session:
+        """
+        A single keep-alive session reuses the TCP/TLS connection across requests.
+        Transient gateway errors are retried by the adapter; 429s are handled by our
+        own backoff in the pagination logic.
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                      allowed_methods=["GET"], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        session.mount('https://', adapter)
+        return session
+
     def _make_request(self, method: str, endpoint: str, params: dict = None) -> dict:
         url = f"{self.base_url}{endpoint}"
         try:
-            response = requests.request(method, url, headers=self.headers, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            raise http_err
+            response = self.session.request(method, url, params=params, timeout=30)
         except requests.exceptions.RequestException as err:
             print(f"[ERROR] A network error occurred: {err}")
-            raise err
+            raise
+        response.raise_for_status()  # HTTP errors (e.g. 429) propagate to the pagination logic
+        return json_loads(response.content)
 
-    def _fetch_all_cvdw_pages(self, endpoint: str, base_params: dict = None) -> list:
+    def _fetch_all_cvdw_pages(self, endpoint: str, base_params: dict = None, columns: tuple = None):
+        """
+        Returns the list of records or, when `columns` is given, a dict mapping each column
+        to the list of its values (column-oriented capture: only the requested fields are
+        kept while paging).
+        """
         if base_params is None: base_params = {}
         all_records = []
+        column_values = {column: [] for column in columns} if columns else None
+        total_records = 0
         page = 1
         base_params['registros_por_pagina'] = 100
         MAX_RETRIES = 5
         BASE_DELAY_SECONDS = 2
+        total_pages = None  # Known after the first page ('total_de_paginas')
         print(f"[FETCH] Starting full data fetch from CVDW endpoint: {endpoint}...")
         while True:
             current_params = base_params.copy()
@@ -67,10 +133,13 @@ class CVCrmAPI:
             for attempt in range(MAX_RETRIES):
                 try:
                     print(f"    Fetching page {page}, attempt {attempt + 1}/{MAX_RETRIES}...")
+                    self.rate_limiter.consume()
                     response = self._make_request("GET", endpoint, params=current_params)
+                    self.rate_limiter.on_success()
                     break
                 except requests.exceptions.HTTPError as e:
                     if e.response.status_code == 429:
+                        self.rate_limiter.on_rate_limited()
                         wait_time = BASE_DELAY_SECONDS * (2 ** attempt)
                         print(f"    [WARN] Rate limit hit (429). Waiting for {wait_time} seconds before retrying...")
                         time.sleep(wait_time)
@@ -80,23 +149,32 @@ class CVCrmAPI:
             if response is None:
                 print(f"[ERROR] Failed to fetch page {page} after {MAX_RETRIES} attempts. Aborting fetch.")
                 break
+            if total_pages is None:
+                total_pages = response.get("total_de_paginas") or 0
             records_on_page = response.get("dados")
             if not records_on_page:
                 print("    No more data found on the final page. Concluding fetch.")
                 break
-            all_records.extend(records_on_page)
+            if column_values is None:
+                all_records.extend(records_on_page)
+            else:
+                for column, values in column_values.items():
+                    values.extend([record.get(column) for record in records_on_page])
+            total_records += len(records_on_page)
+            # Safety net when the API does not report total_de_paginas
             if len(records_on_page) < base_params['registros_por_pagina']:
                 print("    Partial page returned, indicating this is the final page.")
                 break
             page += 1
-            time.sleep(0.5)
-        print(f"[OK] Finished fetching. Total records retrieved: {len(all_records)}")
-        return all_records
+            if total_pages and page > total_pages:
+                break  # Last page reached: no extra request
+        print(f"[OK] Finished fetching. Total records retrieved: {total_records}")
+        return column_values if column_values is not None else all_records
 
-    def get_cvdw_lead_performance_by_broker(self, start_date: str, end_date: str) -> list:
+    def get_cvdw_lead_performance_by_broker(self, start_date: str, end_date: str, columns: tuple = None):
         endpoint = "/cvdw/leads"
         params = { "data_inicio": start_date, "data_fim": end_date }
-        return self._fetch_all_cvdw_pages(endpoint, params)
+        return self._fetch_all_cvdw_pages(endpoint, params, columns)
 
 # --- 3. HELPER FUNCTION FOR DATE PARSING (REMAINS EXACTLY THE SAME) ---
 def get_date_range_from_query(query: str) -> (str, str):
@@ -104,8 +182,12 @@ def get_date_range_from_query(query: str) -> (str, str):
     Analyzes a query for relative date terms and returns a start and end date.
     Returns (None, None) if no specific term is found.
     """
-    today = date.today()
-    query_lower = query.lower()
+    # The result depends on today's date, so it is part of the memoization key
+    return _date_range_for(query.lower(), date.today())
+
+@lru_cache(maxsize=256)
+def _date_range_for(query_lower: str, today: date) -> (str, str):
+    """Memoized worker of get_date_range_from_query (users repeat the same phrases)."""
     start_date, end_date = None, None
     if "este mês" in query_lower or "neste mês" in query_lower:
         start_date = today.replace(day=1)
@@ -139,14 +221,22 @@ def analyze_leads_by_broker(
                        'count_by_broker' (count for one specific broker).
         broker_name: The name of the broker to filter by when using 'count_by_broker'.
     """
+    import pandas as pd  # Deferred: only the tool path needs pandas
+
     print(f"[TOOL] Starting tool 'analyze_leads_by_broker' with analysis type: '{analysis_type}'")
-    all_leads = cv_api.get_cvdw_lead_performance_by_broker(start_date, end_date)
-    if not all_leads:
+    # Only 'CorretorNome' is used below: the fetch keeps just that field of each lead
+    # instead of every record. Broker names repeat heavily, so the column is
+    # categorical (integer codes + one string per broker)
+    brokers = cv_api.get_cvdw_lead_performance_by_broker(start_date, end_date, columns=('CorretorNome',))['CorretorNome']
+    total_leads = len(brokers)
+    if not total_leads:
         return "Análise concluída: Não foram encontrados leads para o período informado."
-    df = pd.DataFrame(all_leads)
+    if any(name is not None for name in brokers):
+        df = pd.DataFrame({'CorretorNome': pd.Categorical(brokers)})
+    else:
+        df = pd.DataFrame(index=range(total_leads))
     try:
         if analysis_type == 'count':
-            total_leads = len(df)
             return f"Análise concluída: Foram encontrados um total de {total_leads} leads."
         elif analysis_type == 'summary_by_broker':
             if 'CorretorNome' not in df.columns:
@@ -158,8 +248,10 @@ def analyze_leads_by_broker(
                 return "Erro de análise: Para contar os leads de um corretor específico, o nome do corretor (broker_name) é necessário."
             if 'CorretorNome' not in df.columns:
                 return "Erro de análise: A coluna 'CorretorNome' não foi encontrada nos dados."
-            broker_leads_df = df[df['CorretorNome'].str.contains(broker_name, case=False, na=False)]
-            count = len(broker_leads_df)
+            # Match the name against each distinct broker once, then count rows by hashed isin
+            brokers = df['CorretorNome']
+            matching = [name for name in brokers.cat.categories if broker_name.lower() in str(name).lower()]
+            count = int(brokers.isin(matching).sum())
             return f"Análise concluída: O corretor '{broker_name}' teve {count} leads."
         else:
             return f"Erro de análise: O tipo de análise '{analysis_type}' não é reconhecido."
@@ -167,8 +259,14 @@ def analyze_leads_by_broker(
         return f"Erro inesperado durante a análise dos dados: {str(e)}"
 
 # --- 5. THE NEW MAIN AGENT LOGIC FOR OLLAMA ---
+OLLAMA_MODEL = 'llama3.2:3b'
+# Keeps the model (and its KV cache of the conversation prefix) loaded between turns,
+# so Ollama only has to evaluate the tokens appended since the previous call
+OLLAMA_KEEP_ALIVE = '30m'
+
 def run_agent():
     """Initializes and runs the agent loop using a local Ollama model via litellm."""
+    import ollama  # Deferred: importing this module (e.g. for its helpers) does not load the client
     
     # Define the tool in the JSON format that litellm/OpenAI expects
     tools = [
@@ -209,9 +307,10 @@ def run_agent():
             # --- First call to the local AI model ---
             print("[AI] Pensando com o modelo local...")
             response = ollama.chat(
-                model='llama3.2:3b',
+                model=OLLAMA_MODEL,
                 messages=messages,
-                tools=tools
+                tools=tools,
+                keep_alive=OLLAMA_KEEP_ALIVE
             )
 
             # --- Manual Tool Calling Logic ---
@@ -238,8 +337,9 @@ def run_agent():
                     # --- Second call to the model to get a natural language summary ---
                     print("[AI] Gerando a resposta final...")
                     final_response = ollama.chat(
-                        model='llama3.2:3b',
-                        messages=messages
+                        model=OLLAMA_MODEL,
+                        messages=messages,
+                        keep_alive=OLLAMA_KEEP_ALIVE
                     )
                     final_answer = final_response['message']['content']
                     print(f"\nAgente: {final_answer}")
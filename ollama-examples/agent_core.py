@@ -1,8 +1,13 @@
 # agent_core.py
 
 import os
-import pandas as pd
-from datetime import datetime, timedelta
+import re
+import hashlib
+import heapq
+import time
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
 import ollama
 from cv_crm_api import CVCrmAPI
 from dotenv import load_dotenv
@@ -23,32 +28,58 @@ crm = CVCrmAPI(subdomain=CV_CRM_SUBDOMAIN, email=CV_CRM_EMAIL, token=CV_CRM_TOKE
 # --- Analytical Tools (Functions) ---
 def get_last_month_dates():
     """Helper function to get start and end dates for the previous month."""
-    today = datetime.today()
+    return _last_month_for(date.today())
+
+@lru_cache(maxsize=1)
+def _last_month_for(today: date):
+    """Computed once per calendar day: the cache key changes at midnight."""
     first_day_of_current_month = today.replace(day=1)
     last_day_of_last_month = first_day_of_current_month - timedelta(days=1)
     first_day_of_last_month = last_day_of_last_month.replace(day=1)
     return first_day_of_last_month.strftime('%Y-%m-%d'), last_day_of_last_month.strftime('%Y-%m-%d')
 
+def _format_table(headers: tuple, rows: list) -> str:
+    """Renders (name, count) rows as an aligned two-column text table."""
+    rows = [(str(name), str(value)) for name, value in rows]
+    name_width = max(len(headers[0]), *(len(name) for name, _ in rows)) if rows else len(headers[0])
+    value_width = max(len(headers[1]), *(len(value) for _, value in rows)) if rows else len(headers[1])
+    lines = [f"{headers[0]:<{name_width}}  {headers[1]:>{value_width}}"]
+    lines += [f"{name:<{name_width}}  {value:>{value_width}}" for name, value in rows]
+    return "\n".join(lines)
+
 def analyze_client_origins() -> str:
     """Analisa e conta as origens de todos os clientes (pessoas) cadastrados no CRM."""
-    clients_data = crm.get_all_clients()
-    if not clients_data: return "Não foi possível obter a lista de clientes ou a lista está vazia."
-    df = pd.DataFrame(clients_data)
-    if 'origem_compra' not in df.columns: return "A coluna 'origem_compra' não foi encontrada."
-    origin_counts = df['origem_compra'].value_counts().reset_index()
-    origin_counts.columns = ['Origem', 'Quantidade']
-    return "Análise da Origem dos Clientes:\n" + origin_counts.to_string(index=False)
-
-def analyze_leads_by_broker() -> str:
+    # Counted page by page while the next pages are still downloading
+    origin_counter = Counter()
+    total_clients = 0
+    for page in crm.iter_client_pages():
+        total_clients += len(page)
+        origin_counter.update(client.get('origem_compra') for client in page)
+    if not total_clients: return "Não foi possível obter a lista de clientes ou a lista está vazia."
+    origin_counter.pop(None, None)  # Missing values are not counted (as in value_counts)
+    if not origin_counter: return "A coluna 'origem_compra' não foi encontrada."
+    return "Análise da Origem dos Clientes:\n" + _format_table(('Origem', 'Quantidade'), origin_counter.most_common())
+
+# Brokers listed by analyze_leads_by_broker (None lists all of them)
+BROKER_RANKING_SIZE = 10
+
+def analyze_leads_by_broker(top_n: int = BROKER_RANKING_SIZE) -> str:
     """Calcula e lista os corretores que mais geraram leads no mês passado, usando o endpoint de Data Warehouse (CVDW)."""
     start_date, end_date = get_last_month_dates()
     performance_data = crm.get_cvdw_lead_performance_by_broker(start_date, end_date)
     if not performance_data: return f"Nenhum dado de performance encontrado para o período ({start_date} a {end_date})."
-    df = pd.DataFrame(performance_data)
-    if 'corretor' not in df.columns or 'total' not in df.columns: return "Colunas esperadas ('corretor', 'total') não encontradas."
-    df = df.rename(columns={'corretor': 'Corretor', 'total': 'Total de Leads'})
-    df_sorted = df.sort_values(by='Total de Leads', ascending=False)
-    return f"Performance dos Corretores (CVDW) ({start_date} a {end_date}):\n" + df_sorted.to_string(index=False)
+    if not any('corretor' in row for row in performance_data) or not any('total' in row for row in performance_data):
+        return "Colunas esperadas ('corretor', 'total') não encontradas."
+    by_total = lambda row: row.get('total') or 0
+    if top_n is None:
+        ranking = sorted(performance_data, key=by_total, reverse=True)
+    else:
+        ranking = heapq.nlargest(top_n, performance_data, key=by_total)  # Partial sort: only the leaders
+    table = _format_table(('Corretor', 'Total de Leads'), [(row.get('corretor'), row.get('total')) for row in ranking])
+    header = f"Performance dos Corretores (CVDW) ({start_date} a {end_date})"
+    if len(ranking) < len(performance_data):
+        header += f" - top {len(ranking)} de {len(performance_data)} corretores"
+    return header + ":\n" + table
 
 # --- Tool Mapping ---
 TOOLS_MAP = {
@@ -56,52 +87,122 @@ TOOLS_MAP = {
     "analyze_leads_by_broker": analyze_leads_by_broker,
 }
 
-# --- Main Agent Logic ---
-def get_agent_response(user_query: str) -> str:
-    """Main function to get a response from the AI agent."""
-    print(f"\n[USER] Query: '{user_query}'")
-    tools_description = ""
-    for name, func in TOOLS_MAP.items():
-        tools_description += f"Ferramenta: {name}\nDescricao: {func.__doc__}\n---\n"
+# Built once at import: the tool set never changes at runtime
+TOOLS_DESCRIPTION = "".join(
+    f"Ferramenta: {name}\nDescricao: {func.__doc__}\n---\n" for name, func in TOOLS_MAP.items()
+)
 
-    prompt = f"""
+# Prompt templates specialized once for the fixed TOOLS_MAP; only the query/result are filled in per call
+SELECTION_PROMPT_TEMPLATE = f"""
     Voce e um assistente de analise de dados para uma imobiliaria. Sua tarefa e analisar a pergunta do usuario e escolher a melhor ferramenta para responde-la.
     Responda APENAS com o nome exato da ferramenta.
 
     Ferramentas disponiveis:
     ---
-    {tools_description}
+    {TOOLS_DESCRIPTION.replace('{', '{{').replace('}', '}}')}
 
-    Pergunta do Usuario: "{user_query}"
+    Pergunta do Usuario: "{{user_query}}"
     Qual ferramenta devo usar?
     """
 
+FORMATTING_PROMPT_TEMPLATE = """
+    A pergunta original do usuario foi: "{user_query}"
+    O resultado da analise foi:
+    ---
+    {result}
+    ---
+    Formule uma resposta amigavel e clara para o usuario em portugues.
+    """
+
+# Keyword router: an unambiguous match picks the tool without asking the LLM
+TOOL_KEYWORDS = {
+    "analyze_client_origins": {"origem", "origens", "cliente", "clientes"},
+    "analyze_leads_by_broker": {"corretor", "corretores", "broker", "brokers", "lead", "leads", "performance"},
+}
+_router_stats = Counter()  # 'hit' / 'miss', printed to tune the keyword lists
+
+# Normalized query -> tool chosen by the LLM (only valid choices are kept)
+TOOL_CHOICE_CACHE_SIZE = 512
+_tool_choice_cache = {}
+
+# (tool, result digest, normalized query) -> (timestamp, formatted answer); LRU with a TTL because CRM data changes
+FORMAT_CACHE_SIZE = 256
+FORMAT_CACHE_TTL_SECONDS = 300
+_format_cache = OrderedDict()
+
+# --- Main Agent Logic ---
+def _ask_llm_for_tool(user_query: str) -> str:
+    prompt = SELECTION_PROMPT_TEMPLATE.format(user_query=user_query)
+
     print("[AI] Escolhendo ferramenta...")
     response = ollama.chat(
         model='llama3.2:3b',
         messages=[{'role': 'user', 'content': prompt}]
     )
-    chosen_tool_name = response['message']['content'].strip()
+    return response['message']['content'].strip()
+
+def _route_by_keywords(normalized_query: str):
+    """Returns the only tool whose keywords appear in the query, or None if zero or several match."""
+    words = set(re.findall(r"\w+", normalized_query))
+    matches = [name for name, keywords in TOOL_KEYWORDS.items() if words & keywords]
+    return matches[0] if len(matches) == 1 else None
+
+def _select_tool(user_query: str) -> str:
+    """Returns the tool for the query, skipping the LLM round-trip for keyword matches and repeated questions."""
+    key = " ".join(user_query.lower().split())
+    tool_name = _route_by_keywords(key)
+    _router_stats["hit" if tool_name else "miss"] += 1
+    print(f"[ROUTER] {'Acerto' if tool_name else 'Sem correspondencia'} por palavra-chave "
+          f"(acertos: {_router_stats['hit']}, falhas: {_router_stats['miss']})")
+    if tool_name is not None:
+        return tool_name
+    tool_name = _tool_choice_cache.get(key)
+    if tool_name is not None:
+        print("[CACHE] Ferramenta reutilizada para pergunta repetida.")
+        return tool_name
+    tool_name = _ask_llm_for_tool(user_query)
+    if tool_name in TOOLS_MAP:
+        if len(_tool_choice_cache) >= TOOL_CHOICE_CACHE_SIZE:
+            del _tool_choice_cache[next(iter(_tool_choice_cache))]  # Drop the oldest entry
+        _tool_choice_cache[key] = tool_name
+    return tool_name
+
+def _format_cached(tool_name: str, result: str, user_query: str) -> str:
+    """Turns the tool result into prose, reusing the answer for the same question over the same fresh result."""
+    # The answer is written for this question: a different question over the same data is not reused
+    normalized_query = " ".join(user_query.lower().split())
+    key = (tool_name, hashlib.blake2b(result.encode(), digest_size=16).hexdigest(), normalized_query)
+    cached = _format_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < FORMAT_CACHE_TTL_SECONDS:
+        _format_cache.move_to_end(key)
+        print("[CACHE] Resposta reutilizada (mesma pergunta e mesmo resultado da ferramenta).")
+        return cached[1]
+
+    print("[AI] Formatando resposta final...")
+    formatting_prompt = FORMATTING_PROMPT_TEMPLATE.format(user_query=user_query, result=result)
+    final_response = ollama.chat(
+        model='llama3.2:3b',
+        messages=[{'role': 'user', 'content': formatting_prompt}]
+    )
+    answer = final_response['message']['content']
+
+    _format_cache[key] = (time.monotonic(), answer)
+    _format_cache.move_to_end(key)
+    if len(_format_cache) > FORMAT_CACHE_SIZE:
+        _format_cache.popitem(last=False)
+    return answer
+
+def get_agent_response(user_query: str) -> str:
+    """Main function to get a response from the AI agent."""
+    print(f"\n[USER] Query: '{user_query}'")
+    chosen_tool_name = _select_tool(user_query)
 
     print(f"[TOOL] Escolhida: '{chosen_tool_name}'")
     if chosen_tool_name in TOOLS_MAP:
         tool_function = TOOLS_MAP[chosen_tool_name]
         result = tool_function()
 
-        print("[AI] Formatando resposta final...")
-        formatting_prompt = f"""
-        A pergunta original do usuario foi: "{user_query}"
-        O resultado da analise foi:
-        ---
-        {result}
-        ---
-        Formule uma resposta amigavel e clara para o usuario em portugues.
-        """
-        final_response = ollama.chat(
-            model='llama3.2:3b',
-            messages=[{'role': 'user', 'content': formatting_prompt}]
-        )
-        return final_response['message']['content']
+        return _format_cached(chosen_tool_name, result, user_query)
     else:
         return "Desculpe, nao tenho uma ferramenta para responder a essa pergunta. Tente novamente."
 
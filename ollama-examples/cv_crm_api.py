@@ -1,13 +1,38 @@
 # cv_crm_api.py
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, count
+
+try:
+    import orjson
+    json_loads = orjson.loads  # Faster parsing of the page payloads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import ijson  # Optional: parses pages straight from the socket stream
+except ImportError:
+    ijson = None
 
 class CVCrmAPI:
     """
     Handles all API communications with the CV CRM, supporting CVDW
     endpoints with robust pagination and rate-limit handling.
     """
+    # --- Configuration for pagination and our retry logic ---
+    RECORDS_PER_PAGE = 100
+    MAX_RETRIES = 5
+    BASE_DELAY_SECONDS = 2  # Backoff factor: the delay doubles on every retry
+    MAX_WORKERS = 8
+    MIN_REQUEST_INTERVAL = 0.1  # Minimum spacing between request starts (all threads)
+    MAX_QUOTA_WAIT_SECONDS = 60  # Cap on the pause requested by X-RateLimit-Reset
+
     def __init__(self, subdomain: str, email: str, token: str):
         if not all([subdomain, email, token]):
             raise ValueError("Subdomain, Email, and Token are all required.")
@@ -18,8 +43,26 @@ class CVCrmAPI:
             'email': email,
             'token': token
         }
+        self.session = self._create_session()
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
         print("[OK] CVCrmAPI initialized and ready.")
 
+    def _create_session(self) -> requests.Session:
+        """
+        A single keep-alive session reuses the TCP/TLS connection across requests.
+        Rate limits (429) and transient server errors are retried by the adapter with
+        exponential backoff, honoring the server's Retry-After header.
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+        retry = Retry(total=self.MAX_RETRIES, backoff_factor=self.BASE_DELAY_SECONDS,
+                      status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"],
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        session.mount('https://', adapter)
+        return session
+
     def _make_request(self, method: str, endpoint: str, params: dict = None) -> dict:
         """
         Helper function to make a single, raw request to the API.
@@ -27,82 +70,151 @@ class CVCrmAPI:
         """
         url = f"{self.base_url}{endpoint}"
         try:
-            response = requests.request(method, url, headers=self.headers, params=params, timeout=30)
-            # This line will automatically raise an HTTPError for statuses like 429, 404, 500, etc.
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            # Re-raise the exception so the calling function can catch it and decide what to do.
-            raise http_err
+            # With ijson the body is parsed while it streams in, so the raw bytes of the
+            # page are never held in memory next to the decoded objects
+            response = self.session.request(method, url, params=params, timeout=30, stream=ijson is not None)
         except requests.exceptions.RequestException as err:
-            # For other network errors (like a timeout or connection error), we also raise it.
+            # Network errors (like a timeout or connection error) are logged and re-raised.
             print(f"❌ A network error occurred: {err}")
-            raise err
+            raise
+        try:
+            self._respect_quota_headers(response)
+            # HTTP errors (429, 404, 500, ...) propagate untouched for the caller to handle.
+            response.raise_for_status()
+            if ijson is None:
+                return json_loads(response.content)
+            response.raw.decode_content = True  # Decompress gzip/deflate inside the stream
+            return next(ijson.items(response.raw, '', use_float=True))
+        finally:
+            response.close()
 
-    def _fetch_all_cvdw_pages(self, endpoint: str, base_params: dict = None) -> list:
+    def _wait_for_request_slot(self):
         """
-        Fetches all records from a CVDW endpoint using robust, continuous pagination
-        and an exponential backoff strategy to handle rate limiting (429 errors).
+        Spaces out request starts across worker threads (a simple shared rate limiter),
+        replacing the fixed sleep between pages.
         """
-        if base_params is None: base_params = {}
-        all_records = []
-        page = 1
-        base_params['registros_por_pagina'] = 100 
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request_at)
+            self._next_request_at = slot + self.MIN_REQUEST_INTERVAL
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _respect_quota_headers(self, response: requests.Response):
+        """
+        When the API reports an exhausted quota (X-RateLimit-Remaining: 0), holds the
+        next request start until X-RateLimit-Reset (epoch seconds or seconds from now).
+        """
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            if int(remaining) > 0:
+                return
+            reset = float(reset)
+        except ValueError:
+            return
+        delay = reset - time.time() if reset > 1e9 else reset
+        if delay <= 0:
+            return
+        delay = min(delay, self.MAX_QUOTA_WAIT_SECONDS)
+        print(f"    [WARN] Request quota exhausted, pausing new requests for {delay:.1f} seconds...")
+        with self._rate_lock:
+            self._next_request_at = max(self._next_request_at, time.monotonic() + delay)
+
+    def _fetch_page_with_retry(self, endpoint: str, base_params: dict, page: int):
+        """
+        Fetches a single page; the session adapter retries 429s with backoff.
+        Returns the response dict, or None if the page was still rate limited after
+        every retry.
+        """
+        current_params = base_params.copy()
+        current_params['pagina'] = page
 
-        # --- Configuration for our retry logic ---
-        MAX_RETRIES = 5
-        BASE_DELAY_SECONDS = 2 # Start with a 2-second delay
+        self._wait_for_request_slot()
+        try:
+            print(f"    Fetching page {page}...")
+            return self._make_request("GET", endpoint, params=current_params)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429:
+                print(f"    [WARN] Rate limit (429) persisted on page {page} after {self.MAX_RETRIES} retries.")
+                return None
+            # It's a different, unrecoverable HTTP error (e.g., 404 Not Found)
+            print(f"❌ Unrecoverable HTTP error encountered: {e}")
+            raise e
+
+    def _iter_cvdw_pages(self, endpoint: str, base_params: dict = None):
+        """
+        Yields the records of a CVDW endpoint one page at a time, in page order. Page 1
+        reveals 'total_de_paginas'; while the caller processes a page, the following ones
+        are already in flight (at most MAX_WORKERS, bounded by the shared rate limiter),
+        so memory stays at a few pages instead of the whole dataset. When the API does
+        not report the total, pages keep coming until an empty or partial page shows up.
+        Each page keeps the exponential backoff strategy for rate limiting (429 errors).
+        """
+        if base_params is None: base_params = {}
+        base_params['registros_por_pagina'] = self.RECORDS_PER_PAGE
 
         print(f"🔎 Starting full data fetch from CVDW endpoint: {endpoint}...")
 
-        while True:
-            current_params = base_params.copy()
-            current_params['pagina'] = page
-            
-            response = None # Initialize response to None for the retry loop
-            
-            # --- Retry Loop: Try fetching the same page up to MAX_RETRIES times ---
-            for attempt in range(MAX_RETRIES):
-                try:
-                    print(f"    Fetching page {page}, attempt {attempt + 1}/{MAX_RETRIES}...")
-                    response = self._make_request("GET", endpoint, params=current_params)
-                    # If the request was successful, break out of the retry loop.
-                    break 
-                except requests.exceptions.HTTPError as e:
-                    # Check if the error is specifically '429 Too Many Requests'
-                    if e.response.status_code == 429:
-                        # Calculate how long to wait, increasing the time with each attempt
-                        wait_time = BASE_DELAY_SECONDS * (2 ** attempt)
-                        print(f"    ⚠️ Rate limit hit (429). Waiting for {wait_time} seconds before retrying...")
-                        time.sleep(wait_time)
-                        # The 'continue' is implicit, the loop will go to the next attempt
-                    else:
-                        # It's a different, unrecoverable HTTP error (e.g., 404 Not Found)
-                        print(f"❌ Unrecoverable HTTP error encountered: {e}")
-                        # Stop the whole process by re-raising the exception
-                        raise e 
-            
-            # If the response is still None after all retries, something went wrong.
-            if response is None:
-                print(f"❌ Failed to fetch page {page} after {MAX_RETRIES} attempts. Aborting fetch.")
-                break
-
-            # --- Process the successful response ---
-            records_on_page = response.get("dados")
-            if not records_on_page:
-                print("    No more data found on the final page. Concluding fetch.")
-                break
-
-            all_records.extend(records_on_page)
-            
-            if len(records_on_page) < base_params['registros_por_pagina']:
-                print("    Partial page returned, indicating this is the final page.")
-                break
-
-            page += 1
-            # A small, polite sleep between *successful* requests is still a good practice.
-            time.sleep(0.5)
+        first_page = self._fetch_page_with_retry(endpoint, base_params, 1)
+        if first_page is None:
+            print(f"❌ Failed to fetch page 1 after {self.MAX_RETRIES} attempts. Aborting fetch.")
+            return
+
+        records_on_page = first_page.get("dados") or []
+        if records_on_page:
+            yield records_on_page
+        total_pages = first_page.get("total_de_paginas")
+        if len(records_on_page) < self.RECORDS_PER_PAGE or total_pages == 1:
+            return
 
+        if total_pages:
+            print(f"    {total_pages} pages in total, prefetching pages 2..{total_pages} concurrently...")
+            pages = iter(range(2, total_pages + 1))
+        else:
+            print("    Total page count not reported, prefetching pages until a partial one...")
+            pages = count(2)
+
+        executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        in_flight = deque()
+        try:
+            for page in pages:
+                in_flight.append((page, executor.submit(self._fetch_page_with_retry, endpoint, base_params, page)))
+                if len(in_flight) < self.MAX_WORKERS:
+                    continue
+                if not (yield from self._yield_next_page(in_flight)):
+                    return
+            while in_flight:
+                if not (yield from self._yield_next_page(in_flight)):
+                    return
+        finally:
+            # Caller stopped early or the data ended: drop pages that have not started
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _yield_next_page(self, in_flight: deque):
+        """
+        Waits for the oldest in-flight page and yields its records. Returns False once the
+        end of the data (a missing, empty or partial page) is reached, so the result stays
+        contiguous.
+        """
+        page, future = in_flight.popleft()
+        response = future.result()
+        if response is None:
+            print(f"❌ Failed to fetch page {page} after {self.MAX_RETRIES} attempts. Aborting fetch.")
+            return False
+        records_on_page = response.get("dados")
+        if not records_on_page:
+            return False
+        yield records_on_page
+        return len(records_on_page) >= self.RECORDS_PER_PAGE
+
+    def _fetch_all_cvdw_pages(self, endpoint: str, base_params: dict = None) -> list:
+        """
+        Fetches all records from a CVDW endpoint into a single list (see _iter_cvdw_pages).
+        """
+        all_records = list(chain.from_iterable(self._iter_cvdw_pages(endpoint, base_params)))
         print(f"✅ Finished fetching. Total records retrieved: {len(all_records)}")
         return all_records
 
@@ -110,6 +222,10 @@ class CVCrmAPI:
     def get_all_clients(self) -> list:
         return self._fetch_all_cvdw_pages("/pessoas")
 
+    def iter_client_pages(self):
+        """Yields the clients page by page, for callers that aggregate while fetching."""
+        return self._iter_cvdw_pages("/pessoas")
+
     def get_cvdw_lead_performance_by_broker(self, start_date: str, end_date: str) -> list:
         endpoint = "/cvdw/leads/corretores"
         params = { "data_inicio": start_date, "data_fim": end_date }
@@ -152,6 +152,56 @@ def test_utils():
     
     return True
 
+# Consultas rotuladas à mão conforme as categorias de CLASSIFY_PROMPT_PREFIX
+LLAMA_EVAL_QUERIES = [
+    ("Quantos leads temos no total?", "QUANTITATIVO"),
+    ("Qual o numero de leads cadastrados?", "QUANTITATIVO"),
+    ("Total de leads da base", "QUANTITATIVO"),
+    ("Contagem de leads cadastrados", "QUANTITATIVO"),
+    ("Ranking dos SDRs", "RESPONSAVEL"),
+    ("Leads por corretor", "RESPONSAVEL"),
+    ("Qual responsavel atendeu mais?", "RESPONSAVEL"),
+    ("Desempenho da equipe de SDRs", "RESPONSAVEL"),
+    ("Leads por origem", "ORIGEM"),
+    ("Qual canal traz mais leads?", "ORIGEM"),
+    ("Resultado por campanha", "ORIGEM"),
+    ("De quais fontes vieram os leads?", "ORIGEM"),
+    ("Status dos leads no funil", "SITUACAO"),
+    ("Em que etapa do funil estao os leads?", "SITUACAO"),
+    ("Distribuicao dos leads por situacao", "SITUACAO"),
+    ("Leads cadastrados na ultima semana", "TEMPORAL"),
+    ("Tendencia de leads nos ultimos meses", "TEMPORAL"),
+    ("Comparar a taxa de conversao entre empreendimentos", "PERFORMANCE"),
+    ("Qual empreendimento teve melhor desempenho?", "PERFORMANCE"),
+    ("Me fale sobre a base", "GERAL"),
+]
+
+def evaluate_llama_classification(task_models=None, min_agreement=0.95):
+    """Avalia a classificação do modelo contra rótulos manuais (troca de modelo)
+
+    Não é um teste do pytest: exige Ollama rodando. Com 20 consultas, o mínimo
+    de 95% tolera um erro. Uso: python tests/test_cvdw.py --avaliar-llama
+    """
+    print("\n=== AVALIAÇÃO: Classificação Llama ===")
+    
+    from cvdw.llama_integration import OllamaIntegration
+    
+    llama = OllamaIntegration(task_models=task_models)
+    if not llama.available:
+        print("Ollama indisponível - avaliação ignorada")
+        return True
+    
+    agreements = 0
+    for query, expected in LLAMA_EVAL_QUERIES:
+        predicted = llama._llm_classification(query)
+        agreements += predicted == expected
+        print(f"  {query}: esperado {expected}, modelo {predicted}")
+    
+    agreement = agreements / len(LLAMA_EVAL_QUERIES)
+    print(f"Concordância: {agreement:.0%} (mínimo {min_agreement:.0%} para adotar o modelo)")
+    
+    return agreement >= min_agreement
+
 def run_all_tests():
     """Executa todos os testes"""
     print("INICIANDO TESTES DO SISTEMA AGENTE POWERBI")
@@ -189,4 +239,7 @@ def run_all_tests():
     return passed == total
 
 if __name__ == "__main__":
-    run_all_tests()
\ No newline at end of file
+    if "--avaliar-llama" in sys.argv:
+        evaluate_llama_classification()
+    else:
+        run_all_tests()
\ No newline at end of file
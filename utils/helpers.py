@@ -2,9 +2,32 @@
 Utilitários auxiliares - Agente PowerBI
 """
 import re
+import pandas as pd
+from collections import Counter
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y",
+    "%Y-%m-%dT%H:%M:%S"
+)
+
+def _guess_date_format(date_str: str) -> Optional[str]:
+    """Formato provável pelo formato da string (separadores e tamanho)"""
+    if date_str[4:5] == '-':
+        if len(date_str) == 10:
+            return "%Y-%m-%d"
+        return "%Y-%m-%dT%H:%M:%S" if date_str[10:11] == 'T' else "%Y-%m-%d %H:%M:%S"
+    if date_str[2:3] == '/':
+        return "%d/%m/%Y" if len(date_str) == 10 else "%d/%m/%Y %H:%M:%S"
+    return None
+
 def format_number(num: int) -> str:
     """Formata números com separadores"""
     return f"{num:,}".replace(',', '.')
@@ -15,8 +38,7 @@ def clean_text(text: str) -> str:
         return str(text)
     
     # Remove quebras de linha extras e espaços
-    text = re.sub(r'\s+', ' ', text.strip())
-    return text
+    return _WHITESPACE_RE.sub(' ', text.strip())
 
 def safe_get(data: Dict, key: str, default: Any = "N/A") -> Any:
     """Obtém valor de dicionário com fallback seguro"""
@@ -27,15 +49,15 @@ def parse_date(date_str: str) -> Optional[datetime]:
     if not isinstance(date_str, str):
         return None
     
-    formats = [
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d",
-        "%d/%m/%Y %H:%M:%S", 
-        "%d/%m/%Y",
-        "%Y-%m-%dT%H:%M:%S"
-    ]
+    # Primeiro o formato indicado pelo formato da string (um único strptime no caso comum)
+    guess = _guess_date_format(date_str)
+    if guess:
+        try:
+            return datetime.strptime(date_str, guess)
+        except ValueError:
+            pass
     
-    for fmt in formats:
+    for fmt in _DATE_FORMATS:
         try:
             return datetime.strptime(date_str, fmt)
         except ValueError:
@@ -80,6 +102,18 @@ def get_period_filter(period: str) -> Dict[str, datetime]:
         "end": now
     })
 
+@lru_cache(maxsize=256)
+def _status_bucket(status: Any) -> Optional[str]:
+    """Categoria de conversão de um status (vocabulário pequeno: memoizado entre chamadas)"""
+    status = str(status).upper()
+    if "VENDA" in status or "VENDIDO" in status:
+        return "vendas"
+    if "RESERVA" in status:
+        return "reservas"
+    if "ATENDIMENTO" in status:
+        return "em_atendimento"
+    return None
+
 def calculate_conversion_rate(leads: List[Dict], status_field: str = "situacao") -> Dict[str, float]:
     """Calcula taxas de conversão"""
     
@@ -89,15 +123,12 @@ def calculate_conversion_rate(leads: List[Dict], status_field: str = "situacao")
     total = len(leads)
     conversions = {}
     
-    for lead in leads:
-        status = lead.get(status_field, "").upper()
-        
-        if "VENDA" in status or "VENDIDO" in status:
-            conversions["vendas"] = conversions.get("vendas", 0) + 1
-        elif "RESERVA" in status:
-            conversions["reservas"] = conversions.get("reservas", 0) + 1
-        elif "ATENDIMENTO" in status:
-            conversions["em_atendimento"] = conversions.get("em_atendimento", 0) + 1
+    # Cada status distinto é normalizado e classificado uma vez
+    status_counts = Counter(lead.get(status_field) or "" for lead in leads)
+    for status, count in status_counts.items():
+        bucket = _status_bucket(status)
+        if bucket:
+            conversions[bucket] = conversions.get(bucket, 0) + count
     
     # Calcula percentuais
     rates = {}
@@ -106,6 +137,18 @@ def calculate_conversion_rate(leads: List[Dict], status_field: str = "situacao")
     
     return rates
 
+def parse_dates(date_strs: List[str]) -> pd.Series:
+    """Versão vetorizada de parse_date: mesmos formatos, na mesma ordem (NaT se nenhum servir)"""
+    series = pd.Series(date_strs, dtype=object)
+    parsed = pd.to_datetime(series, format=_DATE_FORMATS[0], errors='coerce')
+    for fmt in _DATE_FORMATS[1:]:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        # Cada formato é tentado só nas strings que ainda não foram reconhecidas
+        parsed = parsed.fillna(pd.to_datetime(series[missing], format=fmt, errors='coerce'))
+    return parsed
+
 def extract_insights(leads: List[Dict]) -> List[str]:
     """Extrai insights automáticos dos dados"""
     
@@ -118,45 +161,41 @@ def extract_insights(leads: List[Dict]) -> List[str]:
     # Análise básica
     insights.append(f"Total de {total} leads analisados")
     
-    # Top situações
-    situacoes = {}
+    # Uma passada só: contadores por lead; as datas são só coletadas e convertidas de uma vez
+    situacoes = Counter()
+    origens = Counter()
+    date_strs = []
     for lead in leads:
-        sit = lead.get('situacao', 'N/A')
-        situacoes[sit] = situacoes.get(sit, 0) + 1
+        situacoes[lead.get('situacao', 'N/A')] += 1
+        origens[lead.get('origem_nome', lead.get('origem', 'N/A'))] += 1
+        
+        date_str = lead.get('data_cad')
+        if date_str and isinstance(date_str, str):
+            date_strs.append(date_str)
+    
+    dates = parse_dates(date_strs).dropna() if date_strs else None
+    dated = len(dates) if dates is not None else 0
     
+    # Top situações
     if situacoes:
-        top_situacao = max(situacoes.items(), key=lambda x: x[1])
+        top_situacao = situacoes.most_common(1)[0]
         pct = round((top_situacao[1] / total) * 100, 1)
         insights.append(f"Situação predominante: {top_situacao[0]} ({pct}%)")
     
     # Top origens
-    origens = {}
-    for lead in leads:
-        origem = lead.get('origem_nome', lead.get('origem', 'N/A'))
-        origens[origem] = origens.get(origem, 0) + 1
-    
     if origens:
-        top_origem = max(origens.items(), key=lambda x: x[1])
+        top_origem = origens.most_common(1)[0]
         pct = round((top_origem[1] / total) * 100, 1)
         insights.append(f"Principal origem: {top_origem[0]} ({pct}%)")
     
     # Análise temporal (se disponível)
-    dates = []
-    for lead in leads:
-        date_str = lead.get('data_cad')
-        if date_str:
-            parsed = parse_date(date_str)
-            if parsed:
-                dates.append(parsed)
-    
-    if dates:
-        dates.sort()
-        periodo_dias = (dates[-1] - dates[0]).days
+    if dated:
+        periodo_dias = (dates.max() - dates.min()).days
         if periodo_dias > 0:
             insights.append(f"Período analisado: {periodo_dias} dias")
         
         # Média por dia
-        media_dia = len(dates) / max(periodo_dias, 1)
+        media_dia = dated / max(periodo_dias, 1)
         insights.append(f"Média: {media_dia:.1f} leads/dia")
     
     return insights
@@ -177,14 +216,19 @@ def validate_leads_data(leads: List[Dict]) -> Dict[str, Any]:
     # Analisa campos comuns
     common_fields = ['nome', 'situacao', 'origem_nome', 'data_cad', 'email']
     
-    for field in common_fields:
-        field_data = [lead.get(field) for lead in leads]
-        non_empty = [d for d in field_data if d and str(d).strip()]
-        
+    # Uma passada só sobre os leads, contando os campos preenchidos
+    present = dict.fromkeys(common_fields, 0)
+    for lead in leads:
+        for field in common_fields:
+            value = lead.get(field)
+            if value and (not isinstance(value, str) or value.strip()):
+                present[field] += 1
+    
+    for field, filled in present.items():
         validation["fields_analysis"][field] = {
-            "present": len(non_empty),
-            "missing": len(leads) - len(non_empty),
-            "coverage": round((len(non_empty) / len(leads)) * 100, 1)
+            "present": filled,
+            "missing": len(leads) - filled,
+            "coverage": round((filled / len(leads)) * 100, 1)
         }
     
     # Qualidade geral